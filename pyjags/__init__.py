@@ -16,3 +16,4 @@ del get_versions
 from .model import *
 from .modules import *
 
+from .batch import *
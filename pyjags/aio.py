@@ -0,0 +1,142 @@
+# Copyright (C) 2016 Tomasz Miasko
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+"""Support for running models from asyncio event loop. Requires Python 3.5
+or later. Used by Model.update_async and Model.sample_async."""
+
+__all__ = ['AsyncRun', 'Progress']
+
+import asyncio
+import collections
+
+from .console import Console
+from .progressbar import const_time_partition
+
+# Returns the event loop running the current coroutine.
+get_running_loop = getattr(asyncio, 'get_running_loop',
+                           asyncio.get_event_loop)
+
+Progress = collections.namedtuple('Progress', ['done', 'total'])
+Progress.__doc__ = """Progress of asynchronous run: number of iterations
+done so far, and total number of iterations."""
+
+
+class AsyncRun:
+    """Updates or samples a model in chunks, without blocking the event loop.
+
+    Chunks are executed outside of the event loop, with each console of the
+    model updated in its own thread, so that chains run in parallel when the
+    model uses multiple threads. Chunks take roughly refresh_seconds of the
+    model.
+
+    The run starts when it is first awaited or iterated over. Awaiting it
+    gives the result, i.e., samples or None. Iterating over it with ``async
+    for`` gives Progress after each chunk. Cancelling a task awaiting the
+    run stops chains after the current iteration, or at the end of the
+    current chunk for the 'process' backend. Monitors are cleared in any
+    case.
+
+    >>> run = model.sample_async(1000)
+    >>> async for progress in run:
+    ...     print(progress.done, 'of', progress.total)
+    >>> samples = await run
+    """
+
+    def __init__(self, model, iterations, vars=None, thin=1,
+                 monitor_type='trace', sample=True):
+        self.model = model
+        self.iterations = iterations
+        self.vars = vars
+        self.thin = thin
+        self.monitor_type = monitor_type
+        self.sample = sample
+        self.task = None
+        self.progress = None
+        self.finished = False
+
+    def start(self):
+        if self.task is None:
+            self.progress = asyncio.Queue()
+            self.task = asyncio.ensure_future(self.run())
+        return self.task
+
+    def __await__(self):
+        return self.start().__await__()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.finished:
+            raise StopAsyncIteration
+        self.start()
+        progress = await self.progress.get()
+        if progress is None:
+            self.finished = True
+            if self.task.done() and not self.task.cancelled():
+                # Raises exception of the run, if any.
+                self.task.result()
+            raise StopAsyncIteration
+        return progress
+
+    async def run(self):
+        model = self.model
+        try:
+            if not self.sample:
+                await self.update()
+                return None
+            vars = self.vars
+            if vars is None:
+                vars = model.variables
+            with model._monitors(vars, self.thin, self.monitor_type):
+                await self.update()
+                return model.console.dumpMonitors(self.monitor_type, False)
+        finally:
+            self.progress.put_nowait(None)
+
+    async def update(self):
+        loop = get_running_loop()
+        model = self.model
+        if model.use_threads:
+            consoles = model.console.consoles
+        else:
+            consoles = [model.console]
+
+        def update(index, steps):
+            if model.use_threads:
+                # Use the thread of the console.
+                return asyncio.wrap_future(model.console.submit(
+                    index, consoles[index].update, steps))
+            return loop.run_in_executor(None, consoles[index].update, steps)
+
+        done = 0
+        for steps in const_time_partition(self.iterations,
+                                          model.refresh_seconds):
+            future = asyncio.gather(*[update(index, steps)
+                                      for index in range(len(consoles))])
+            try:
+                await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # Stop consoles after current iteration, and wait for them.
+                # Consoles in worker processes finish the chunk.
+                native = [c for c in consoles if isinstance(c, Console)]
+                for console in native:
+                    console.interrupt()
+                while not future.done():
+                    try:
+                        await asyncio.wait([future])
+                    except asyncio.CancelledError:
+                        pass
+                for console in native:
+                    console.interrupt(False)
+                raise
+            done += steps
+            self.progress.put_nowait(Progress(done, self.iterations))
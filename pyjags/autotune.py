@@ -0,0 +1,117 @@
+# Copyright (C) 2016 Tomasz Miasko
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+"""Selection of threads and chains_per_thread for Model(threads='auto')."""
+
+__all__ = ['Layout', 'candidate_layouts', 'tune_layout']
+
+import collections
+import logging
+import os
+
+from .progressbar import default_timer
+
+logger = logging.getLogger('pyjags')
+
+# Total duration of pilot runs, in seconds.
+PILOT_SECONDS = 2.0
+
+Layout = collections.namedtuple(
+    'Layout', ['threads', 'chains_per_thread', 'iterations_per_second'])
+Layout.__doc__ = """Layout of chains measured by a pilot run: number of
+threads, maximum number of chains per thread, and number of iterations of all
+chains done per second."""
+
+
+def candidate_layouts(chains, cpus=None):
+    """Returns a list of distinct (threads, chains_per_thread) pairs, which
+    use at most cpus threads, by default the number of processors.
+
+    >>> candidate_layouts(4, cpus=8)
+    [(4, 1), (2, 2), (1, 4)]
+    """
+    cpus = cpus or getattr(os, 'cpu_count', lambda: 1)() or 1
+    layouts = []
+    seen = set()
+    for chains_per_thread in range(1, chains + 1):
+        threads = -(-chains // chains_per_thread)
+        if threads <= cpus and threads not in seen:
+            seen.add(threads)
+            layouts.append((threads, chains_per_thread))
+    return layouts
+
+
+def pilot(model, seconds, timer=default_timer):
+    """Updates model for about given number of seconds and returns the number
+    of iterations done per second."""
+    iterations = 0
+    steps = 1
+    start = timer()
+    while True:
+        model.update(steps)
+        iterations += steps
+        elapsed = timer() - start
+        if elapsed >= seconds:
+            return iterations / elapsed
+        # Double until the remaining time is likely to be exceeded.
+        steps = min(2 * steps, max(1, int((seconds - elapsed) *
+                                          iterations / max(elapsed, 1e-9))))
+
+
+def tune_layout(create, chains, seconds=PILOT_SECONDS, cpus=None,
+                timer=default_timer):
+    """
+    Measures speed of candidate layouts of chains and returns the fastest one.
+
+    Parameters
+    ----------
+    create : callable
+        Called with threads and chains_per_thread, returns a compiled Model
+        without progress bar. Each model is updated for a fraction of seconds
+        and closed afterwards.
+    chains : int
+        Number of chains of the model.
+    seconds : float, optional
+        Total duration of pilot runs.
+    cpus : int, optional
+        Maximum number of threads, by default the number of processors.
+
+    Returns
+    -------
+    best : Layout
+        The fastest layout. When there is only one candidate layout, it is
+        returned without a pilot run, with NaN iterations per second.
+    layouts : list of Layout
+        All measured layouts.
+    """
+    candidates = candidate_layouts(chains, cpus)
+    if len(candidates) == 1:
+        # Nothing to choose from, speed is not measured.
+        best = Layout(candidates[0][0], candidates[0][1], float('nan'))
+        logger.info('Selected threads=%d, chains_per_thread=%d, the only '
+                    'layout available.', best.threads, best.chains_per_thread)
+        return best, [best]
+    layouts = []
+    for threads, chains_per_thread in candidates:
+        model = create(threads, chains_per_thread)
+        try:
+            rate = pilot(model, seconds / len(candidates), timer)
+        finally:
+            model.close()
+        layouts.append(Layout(threads, chains_per_thread, rate))
+        logger.debug('Pilot run with threads=%d, chains_per_thread=%d: '
+                     '%.1f iterations per second.',
+                     threads, chains_per_thread, rate)
+    best = max(layouts, key=lambda layout: layout.iterations_per_second)
+    logger.info('Selected threads=%d, chains_per_thread=%d with %.1f '
+                'iterations per second.', best.threads,
+                best.chains_per_thread, best.iterations_per_second)
+    return best, layouts
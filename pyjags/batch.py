@@ -0,0 +1,140 @@
+# Copyright (C) 2016 Tomasz Miasko
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+__all__ = ['fit_many']
+
+import itertools
+import multiprocessing
+import sys
+
+from .console import JagsError
+from .model import Model
+from .process import spawn_context
+
+# Model options set by fit_many, which can not be passed in its kwargs.
+CONTROLLED_OPTIONS = ('file', 'progress_bar', 'threads')
+
+# Model cached by a worker process, together with the code and options used
+# to create it.
+worker_model = None
+
+
+def fit(code, options, data, init, adapt, iterations, vars, thin):
+    """Fits model to data in a worker process. Model parsed by previous call
+    with the same code and options is reused."""
+    global worker_model
+    try:
+        if worker_model is not None and worker_model[:2] == (code, options):
+            model = worker_model[2].with_data(data, init=init, adapt=adapt)
+        else:
+            worker_model = None
+            model = Model(code=code, data=data, init=init, adapt=adapt,
+                          progress_bar=False, **options)
+            worker_model = (code, options, model)
+        return 'ok', model.sample(iterations, vars=vars, thin=thin)
+    except JagsError as err:
+        # JagsError is not picklable, send only the message.
+        return 'jags_error', str(err)
+
+
+def fit_many(code, datasets, chains=4, iterations=1000, workers=None,
+             adapt=1000, init=None, vars=None, thin=1, ordered=False,
+             **kwargs):
+    """
+    Fits the same model to many data sets using a pool of worker processes,
+    and yields samples of each fit as soon as it is finished.
+
+    Each worker process samples a single model at a time, in a single
+    thread, so that workers do not compete for processors. Model parsed by a
+    worker is reused for subsequent data sets, see Model.with_data. Data sets
+    are consumed lazily and at most two per worker are in flight, so memory
+    use does not depend on the number of data sets. Worker processes are
+    started with spawn method where supported, see
+    pyjags.process.spawn_context.
+
+    Parameters
+    ----------
+    code : str or bytes
+        Code of the model.
+    datasets : iterable of dicts
+        Data sets, each in a format accepted by Model.
+    chains : int, 4 by default
+        Number of chains of each model.
+    iterations : int, 1000 by default
+        Number of iterations sampled from each model.
+    workers : int, optional
+        Number of worker processes, by default number of processors.
+    adapt : int, 1000 by default
+        Number of adaptation steps of each model.
+    init : dict or list of dicts, optional
+        Initial values, see Model.
+    vars : list of str, optional
+        A list of variables to monitor.
+    thin : int, optional
+        A positive integer specifying thinning interval.
+    ordered : bool, optional
+        If true, results are yielded in order of data sets, otherwise in
+        order of completion.
+    kwargs
+        Other arguments passed to Model constructor, e.g., generate_data,
+        except for options controlled by fit_many: file, progress_bar and
+        threads.
+
+    Yields
+    ------
+    index : int
+        Index of data set in datasets.
+    samples : dict
+        Samples in the same format as returned from Model.sample.
+    """
+    from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+    controlled = set(kwargs) & set(CONTROLLED_OPTIONS)
+    if controlled:
+        raise TypeError('fit_many does not accept arguments: {}'.format(
+            ', '.join(sorted(controlled))))
+    encoding = kwargs.pop('encoding', 'utf-8')
+    if isinstance(code, str):
+        code = code.encode(encoding)
+    options = dict(kwargs, chains=chains, threads=1)
+    datasets = enumerate(datasets)
+
+    workers = workers or multiprocessing.cpu_count()
+    if sys.version_info >= (3, 7):
+        executor = ProcessPoolExecutor(workers, mp_context=spawn_context())
+    else:
+        executor = ProcessPoolExecutor(workers)
+    with executor:
+        pending = {}
+        limit = 2 * workers
+        try:
+            while True:
+                for index, data in itertools.islice(
+                        datasets, limit - len(pending)):
+                    future = executor.submit(fit, code, options, data, init,
+                                             adapt, iterations, vars, thin)
+                    pending[future] = index
+                if not pending:
+                    break
+                if ordered:
+                    done = [min(pending, key=pending.get)]
+                else:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    done = sorted(done, key=pending.get)
+                for future in done:
+                    index = pending.pop(future)
+                    status, result = future.result()
+                    if status == 'jags_error':
+                        raise JagsError(result)
+                    yield index, result
+        finally:
+            for future in pending:
+                future.cancel()
@@ -0,0 +1,168 @@
+# Copyright (C) 2016 Tomasz Miasko
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+__all__ = ['Checkpoint', 'CheckpointDirectory', 'save_checkpoint',
+           'load_checkpoint']
+
+import collections
+import os
+
+import numpy as np
+
+# Atomically replaces destination with source, also on Windows in Python 3.
+replace = getattr(os, 'replace', os.rename)
+
+Checkpoint = collections.namedtuple(
+    'Checkpoint', ['parameters', 'iteration', 'adapting'])
+Checkpoint.__doc__ = """State of a model saved in a checkpoint.
+
+Attributes
+----------
+parameters : list of dicts
+    Values of parameters of each chain, including '.RNG.name' and
+    '.RNG.state', as returned from Model.parameters.
+iteration : int
+    Number of iterations done by the model.
+adapting : bool
+    Whether the model was in adaptive mode.
+"""
+
+# Version of checkpoint format.
+VERSION = 1
+
+
+def save_checkpoint(file, checkpoint):
+    """Saves checkpoint in numpy .npz format.
+
+    Parameters
+    ----------
+    file : str or file
+        Path of the file, or a file opened in binary mode.
+    checkpoint : Checkpoint
+        State of the model.
+    """
+    arrays = {
+        'version': np.array(VERSION),
+        'chains': np.array(len(checkpoint.parameters)),
+        'iteration': np.array(checkpoint.iteration),
+        'adapting': np.array(checkpoint.adapting),
+    }
+    for chain, parameters in enumerate(checkpoint.parameters):
+        for name, value in parameters.items():
+            # Missing values are kept as JAGS_NA.
+            arrays['chain{}/{}'.format(chain, name)] = np.ma.getdata(value)
+    if isinstance(file, str):
+        with open(file, 'wb') as f:
+            np.savez(f, **arrays)
+    else:
+        np.savez(file, **arrays)
+
+
+def load_checkpoint(file):
+    """Loads checkpoint saved with save_checkpoint.
+
+    Parameters
+    ----------
+    file : str or file
+        Path of the file, or a file opened in binary mode.
+
+    Returns
+    -------
+    Checkpoint
+    """
+    with np.load(file, allow_pickle=False) as arrays:
+        version = int(arrays['version'])
+        if version != VERSION:
+            raise ValueError(
+                'Unsupported checkpoint version {}.'.format(version))
+        parameters = [{} for _ in range(int(arrays['chains']))]
+        for key in arrays.files:
+            if not key.startswith('chain') or '/' not in key:
+                continue
+            chain, name = key.split('/', 1)
+            value = arrays[key]
+            if name == '.RNG.name':
+                value = str(value)
+            parameters[int(chain[len('chain'):])][name] = value
+        return Checkpoint(parameters, int(arrays['iteration']),
+                          bool(arrays['adapting']))
+
+
+class CheckpointDirectory:
+    """Directory with checkpoints of a long running job, e.g., sampling.
+
+    Besides the latest checkpoint of the model, the directory holds a
+    description of the job, used to verify that a resumed job is the same as
+    the original one, and may hold other files, e.g., a TraceStore.
+    Checkpoints are replaced atomically, so that a job interrupted at any
+    point can be resumed from the last complete checkpoint.
+    """
+
+    def __init__(self, directory):
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.directory = directory
+
+    def path(self, name):
+        """Path of a file in the directory."""
+        return os.path.join(self.directory, name)
+
+    def save(self, checkpoint):
+        """Replaces the latest checkpoint."""
+        path = self.path('checkpoint.npz')
+        with open(path + '.tmp', 'wb') as f:
+            save_checkpoint(f, checkpoint)
+            f.flush()
+            os.fsync(f.fileno())
+        replace(path + '.tmp', path)
+
+    def load(self):
+        """Returns the latest checkpoint, or None if there is none."""
+        path = self.path('checkpoint.npz')
+        if not os.path.exists(path):
+            return None
+        return load_checkpoint(path)
+
+    def start(self, job, resume, iteration):
+        """Starts a job described by a dictionary of arrays, at given
+        iteration of the model.
+
+        When resume is true and the directory contains a checkpoint of the
+        same job, the job is resumed. Otherwise, a previous checkpoint is
+        removed, and the job is started anew.
+
+        Returns
+        -------
+        checkpoint : Checkpoint or None
+            The latest checkpoint of resumed job.
+        start : int
+            Iteration of the model at which the job started.
+        """
+        path = self.path('job.npz')
+        if resume and os.path.exists(path):
+            with np.load(path, allow_pickle=False) as previous:
+                start = int(previous['start'])
+                previous = dict((k, previous[k]) for k in previous.files
+                                if k != 'start')
+            if set(previous) != set(job) or not all(
+                    np.array_equal(previous[k], job[k]) for k in job):
+                raise ValueError(
+                    'Checkpoint in {} is from a different job.'.format(
+                        self.directory))
+            checkpoint = self.load()
+            if checkpoint is not None:
+                return checkpoint, start
+        if os.path.exists(self.path('checkpoint.npz')):
+            os.remove(self.path('checkpoint.npz'))
+        with open(path + '.tmp', 'wb') as f:
+            np.savez(f, start=np.array(iteration), **job)
+        replace(path + '.tmp', path)
+        return None, iteration
@@ -22,7 +22,11 @@
 #include <util/nainf.h>
 #include <version.h>
 
+#include <algorithm>
+#include <atomic>
 #include <cstring>
+#include <memory>
+#include <mutex>
 #include <sstream>
 
 namespace py = pybind11;
@@ -64,8 +68,60 @@ public:
 // Exception object used to report errors. Created during module initialization.
 py::object JagsError;
 
-// Converts numpy array to JAGS SArray.
+// The numpy.ma.MaskedArray class. Imported during module initialization.
+py::object MaskedArray;
+
+// Opens a string for reading as a file. Returns nullptr on failure, with
+// errno set. Where fmemopen is not available, the string is written to a
+// temporary file.
+FILE *open_string(const std::string &s) {
+#ifdef _WIN32
+  FILE *file = tmpfile();
+  if (!file)
+    return nullptr;
+  if (fwrite(s.data(), 1, s.size(), file) != s.size()) {
+    fclose(file);
+    return nullptr;
+  }
+  rewind(file);
+  return file;
+#else
+  return fmemopen(const_cast<char *>(s.data()), s.size(), "rb");
+#endif
+}
+
+// JAGS parser keeps its state in global variables, so models can be parsed by
+// only one console at a time.
+std::mutex parser_mutex;
+
+// Compiling with a data block initializes a data generating model, which takes
+// its random number generator from global factories without any locking.
+std::mutex rng_factory_mutex;
+
+// Returns JAGS_NA for missing values, i.e., NaNs and masked values, and the
+// value itself otherwise.
+inline double to_jags_value(double value, const npy_bool *mask,
+                            npy_intp index) {
+  return (value != value || (mask && mask[index])) ? JAGS_NA : value;
+}
+
+// Converts numpy array to JAGS SArray. Missing values, i.e., NaNs and values
+// masked in numpy MaskedArray, are replaced with JAGS_NA.
 SArray to_jags(py::object src) {
+  // Separate masked array into data and mask. Mask that is not an array
+  // indicates that no values are masked.
+  py::object mask;
+  const int is_masked = PyObject_IsInstance(src.ptr(), MaskedArray.ptr());
+  if (is_masked < 0) {
+    throw py::error_already_set();
+  } else if (is_masked) {
+    mask = src.attr("mask");
+    src = src.attr("data");
+    if (!PyArray_Check(mask.ptr())) {
+      mask = py::object();
+    }
+  }
+
   // Ensure we have a source numpy array.
   const py::object src_array = py::reinterpret_steal<py::object>(
       PyArray_FromAny(src.ptr(), NULL, 1, 0, 0, 0));
@@ -75,10 +131,39 @@ SArray to_jags(py::object src) {
   PyArrayObject *src_numpy = (PyArrayObject *)src_array.ptr();
   const int ndim = PyArray_NDIM(src_numpy);
   npy_intp *dims = PyArray_DIMS(src_numpy);
+  const npy_intp size = PyArray_SIZE(src_numpy);
+
+  // Ensure mask elements are in fortran order, the same as in SArray.
+  py::object mask_array;
+  const npy_bool *mask_data = nullptr;
+  if (mask) {
+    mask_array = py::reinterpret_steal<py::object>(PyArray_FromAny(
+        mask.ptr(), PyArray_DescrFromType(NPY_BOOL), 1, 0,
+        NPY_ARRAY_F_CONTIGUOUS | NPY_ARRAY_ALIGNED, NULL));
+    if (!mask_array) {
+      throw py::error_already_set();
+    }
+    if (PyArray_SIZE((PyArrayObject *)mask_array.ptr()) != size) {
+      PyErr_SetString(PyExc_ValueError, "Mask and data sizes differ.");
+      throw py::error_already_set();
+    }
+    mask_data =
+        (const npy_bool *)PyArray_DATA((PyArrayObject *)mask_array.ptr());
+  }
 
   SArray dst{{dims, dims + ndim}};
   double *data = const_cast<double *>(dst.value().data());
 
+  if (PyArray_TYPE(src_numpy) == NPY_DOUBLE && PyArray_ISFARRAY_RO(src_numpy) &&
+      PyArray_ISNOTSWAPPED(src_numpy)) {
+    // Fast path for doubles already in fortran order, copy them directly.
+    const double *src_data = (const double *)PyArray_DATA(src_numpy);
+    for (npy_intp i = 0; i < size; ++i) {
+      data[i] = to_jags_value(src_data[i], mask_data, i);
+    }
+    return dst;
+  }
+
   // Create numpy view onto destination SArray. Its elements are in fortran
   // order.
   py::object dst_array = py::reinterpret_steal<py::object>(
@@ -91,25 +176,71 @@ SArray to_jags(py::object src) {
   if (PyArray_CopyInto(dst_numpy, src_numpy) != 0) {
     throw py::error_already_set();
   }
+  for (npy_intp i = 0; i < size; ++i) {
+    data[i] = to_jags_value(data[i], mask_data, i);
+  }
   return dst;
 }
 
-// Converts JAGS SArray to numpy array.
-py::array to_python(const SArray &sarray) {
+// Capsule destructor for values moved out of SArray.
+void delete_values(void *values) {
+  delete static_cast<std::vector<double> *>(values);
+}
+
+// Converts JAGS SArray to numpy array. Values are moved out of the SArray
+// into a buffer owned by the returned array, leaving the SArray empty. When
+// SArray contains JAGS_NA values, returns numpy MaskedArray with those values
+// masked.
+py::object to_python(SArray &sarray) {
   std::vector<npy_intp> dims{sarray.dim(false).begin(),
                              sarray.dim(false).end()};
-  double *data = const_cast<double *>(sarray.value().data());
 
-  // Creat a view over sarray data. Its elements are in fortran order.
-  py::object view = py::reinterpret_steal<py::object>(
+  // Take over SArray storage without copying its elements.
+  std::unique_ptr<std::vector<double>> values{new std::vector<double>()};
+  values->swap(const_cast<std::vector<double> &>(sarray.value()));
+  double *data = values->empty() ? nullptr : values->data();
+  const double *end = data + values->size();
+  const double *na = std::find(static_cast<const double *>(data), end, JAGS_NA);
+
+  // Create an array over the moved data. Its elements are in fortran order.
+  // When data is empty, numpy allocates its own storage instead.
+  py::object array = py::reinterpret_steal<py::object>(
       PyArray_New(&PyArray_Type, dims.size(), dims.data(), NPY_DOUBLE, NULL,
-                  data, 0, NPY_ARRAY_F_CONTIGUOUS, NULL));
-  if (!view) {
+                  data, 0, NPY_ARRAY_F_CONTIGUOUS | NPY_ARRAY_WRITEABLE, NULL));
+  if (!array) {
     throw py::error_already_set();
   }
+  if (!data) {
+    return array;
+  }
+
+  // Make the array responsible for releasing the data.
+  py::capsule owner(values.get(), &delete_values);
+  values.release();
+  if (PyArray_SetBaseObject((PyArrayObject *)array.ptr(),
+                            owner.release().ptr()) != 0) {
+    throw py::error_already_set();
+  }
+
+  if (na == end) {
+    return array;
+  }
 
-  return py::reinterpret_steal<py::object>(
-      PyArray_NewCopy((PyArrayObject *)view.ptr(), NPY_ANYORDER));
+  // Mask missing values, starting from the first one found above.
+  py::object mask = py::reinterpret_steal<py::object>(
+      PyArray_New(&PyArray_Type, dims.size(), dims.data(), NPY_BOOL, NULL,
+                  NULL, 0, NPY_ARRAY_F_CONTIGUOUS, NULL));
+  if (!mask) {
+    throw py::error_already_set();
+  }
+  npy_bool *mask_data = (npy_bool *)PyArray_DATA((PyArrayObject *)mask.ptr());
+  const std::ptrdiff_t first = na - data;
+  std::fill(mask_data, mask_data + first, NPY_FALSE);
+  for (const double *value = na; value != end; ++value) {
+    mask_data[value - data] = *value == JAGS_NA;
+  }
+  return MaskedArray(array, py::arg("mask") = mask,
+                     py::arg("fill_value") = JAGS_NA);
 }
 
 // Converts Python dictionary to JAGS map.
@@ -123,10 +254,10 @@ std::map<std::string, SArray> to_jags(py::dict dictionary) {
   return result;
 }
 
-// Converts JAGS map to Python dictionary.
-py::dict to_python(const std::map<std::string, SArray> &map) {
+// Converts JAGS map to Python dictionary. Values are moved out of the map.
+py::dict to_python(std::map<std::string, SArray> &map) {
   py::dict result;
-  for (const auto &item : map) {
+  for (auto &item : map) {
     result[item.first.c_str()] = to_python(item.second);
   }
   return result;
@@ -137,6 +268,10 @@ class JagsConsole {
   std::stringstream out_stream_;
   std::stringstream err_stream_;
   Console console_;
+  // Number of iterations done by update in progress.
+  std::atomic<unsigned int> progress_;
+  // Set to stop update in progress, or the next one if none is in progress.
+  std::atomic<bool> interrupted_;
 
   JagsConsole(const JagsConsole &) = delete;
   JagsConsole &operator=(const JagsConsole &) = delete;
@@ -155,8 +290,18 @@ class JagsConsole {
     }
   }
 
+  void checkModelFile(FILE *file) {
+    invoke([&] {
+      py::gil_scoped_release release;
+      std::lock_guard<std::mutex> lock(parser_mutex);
+      return console_.checkModel(file);
+    });
+  }
+
 public:
-  JagsConsole() : console_(out_stream_, err_stream_) {}
+  JagsConsole()
+      : console_(out_stream_, err_stream_), progress_(0), interrupted_(false) {
+  }
 
   void checkModel(const std::string &path) {
     file_handle fh(fopen(path.c_str(), "rb"));
@@ -164,12 +309,27 @@ public:
       PyErr_SetFromErrnoWithFilename(JagsError.ptr(), path.c_str());
       throw py::error_already_set();
     }
-    invoke([&] { return console_.checkModel(fh.file()); });
+    checkModelFile(fh.file());
+  }
+
+  void checkModelFromString(const std::string &code) {
+    file_handle fh(open_string(code));
+    if (!fh) {
+      PyErr_SetFromErrno(JagsError.ptr());
+      throw py::error_already_set();
+    }
+    checkModelFile(fh.file());
   }
 
   void compile(const py::dict &data, unsigned int chains, bool generate_data) {
     auto jags_data = to_jags(data);
-    invoke([&] { return console_.compile(jags_data, chains, generate_data); });
+    invoke([&] {
+      py::gil_scoped_release release;
+      std::unique_lock<std::mutex> lock(rng_factory_mutex, std::defer_lock);
+      if (generate_data)
+        lock.lock();
+      return console_.compile(jags_data, chains, generate_data);
+    });
   }
 
   void setParameters(const py::dict &parameters, unsigned int chain) {
@@ -181,14 +341,39 @@ public:
   }
 
   void initialize() {
-    invoke([&] { return console_.initialize(); });
+    invoke([&] {
+      py::gil_scoped_release release;
+      return console_.initialize();
+    });
   }
 
-  void update(unsigned int iterations) {
+  // Updates the model one iteration at a time, so that progress can be
+  // observed and update interrupted from other threads. Returns number of
+  // iterations done, which is smaller than requested when interrupted.
+  unsigned int update(unsigned int iterations) {
+    unsigned int done = 0;
     invoke([&] {
       py::gil_scoped_release release;
-      return console_.update(iterations);
+      bool success = true;
+      while (done < iterations && !interrupted_.exchange(false)) {
+        success = console_.update(1);
+        if (!success) {
+          break;
+        }
+        progress_.store(++done, std::memory_order_relaxed);
+      }
+      progress_.store(0, std::memory_order_relaxed);
+      return success;
     });
+    return done;
+  }
+
+  unsigned int progress() const {
+    return progress_.load(std::memory_order_relaxed);
+  }
+
+  void interrupt(bool value) {
+    interrupted_.store(value);
   }
 
   void setMonitor(const std::string &name, unsigned int thin,
@@ -352,6 +537,8 @@ PYBIND11_MODULE(console, module) {
     throw py::error_already_set();
   }
 
+  MaskedArray = py::module::import("numpy.ma").attr("MaskedArray");
+
   if (std::strcmp(PYJAGS_JAGS_VERSION, jags_version()) != 0) {
     PyErr_Format(JagsError.ptr(),
                  "Incompatible JAGS version. "
@@ -379,6 +566,10 @@ PYBIND11_MODULE(console, module) {
       .def(py::init<>())
       .def("checkModel", &JagsConsole::checkModel, py::arg("path"),
            "Load the model from a file and checks its syntactic correctness.")
+      .def("checkModelFromString", &JagsConsole::checkModelFromString,
+           py::arg("code"),
+           "Load the model from a string and checks its syntactic "
+           "correctness.")
       .def("compile", &JagsConsole::compile, py::arg("data"), py::arg("chains"),
            py::arg("generate_data"), "Compiles the model.")
       .def("setParameters", &JagsConsole::setParameters, py::arg("parameters"),
@@ -388,7 +579,16 @@ PYBIND11_MODULE(console, module) {
            py::arg("chain"), "Sets the name of the RNG for the given chain.")
       .def("initialize", &JagsConsole::initialize, "Initializes the model.")
       .def("update", &JagsConsole::update, py::arg("iterations"),
-           "Updates the Markov chain generated by the model.")
+           "Updates the Markov chain generated by the model. Returns number "
+           "of iterations done.")
+      .def("progress", &JagsConsole::progress,
+           "Returns number of iterations done by update in progress. Can be "
+           "called from other threads.")
+      .def("interrupt", &JagsConsole::interrupt, py::arg("value") = true,
+           "Sets flag that stops update in progress after the current "
+           "iteration, or the next update if none is in progress. Flag is "
+           "cleared when it stops an update, or with interrupt(False). Can "
+           "be called from other threads.")
       .def("setMonitor", &JagsConsole::setMonitor, py::arg("name"),
            py::arg("thin"), py::arg("type"),
            "Sets a monitor for the given node array.")
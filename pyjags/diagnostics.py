@@ -0,0 +1,358 @@
+# encoding: utf-8
+#
+# Copyright (C) 2016 Tomasz Miasko
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+"""Convergence diagnostics for samples returned from Model.sample.
+
+Implements rank normalized split R-hat, bulk and tail effective sample size
+and Monte Carlo standard error of the mean, as described in Vehtari, Gelman,
+Simpson, Carpenter and Bürkner (2021), "Rank-normalization, folding, and
+localization: An improved R-hat for assessing convergence of MCMC".
+
+All functions accept either a single array with shape (dim_1, ..., dim_n,
+iterations, chains), or a dictionary of such arrays as returned from
+Model.sample. Diagnostics are computed for all elements of all variables at
+once, and for large inputs in multiple threads. Results have shape (dim_1,
+..., dim_n), or are dictionaries of such arrays. Masked elements give NaN.
+"""
+
+__all__ = ['rhat', 'ess_bulk', 'ess_tail', 'ess_mean', 'mcse_mean',
+           'diagnose']
+
+import math
+import os
+
+import numpy as np
+
+# Inputs with more values than that are processed in multiple threads.
+THREADS_MIN_SIZE = 1 << 20
+
+DIAGNOSTICS = ('rhat', 'ess_bulk', 'ess_tail', 'mcse_mean')
+
+
+def rhat(samples, threads=None):
+    """Rank normalized split R-hat. Maximum of bulk and tail R-hat.
+
+    Parameters
+    ----------
+    samples : dict or numpy.ndarray
+        Samples with shape (dim_1, ..., dim_n, iterations, chains).
+    threads : int, optional
+        Number of threads to use, by default number of CPUs.
+    """
+    return apply(rhat_block, samples, threads)
+
+
+def ess_bulk(samples, threads=None):
+    """Bulk effective sample size, computed on rank normalized split chains.
+    See rhat for description of parameters."""
+    return apply(ess_bulk_block, samples, threads)
+
+
+def ess_tail(samples, threads=None):
+    """Tail effective sample size. Minimum of effective sample sizes of 5%
+    and 95% quantiles. See rhat for description of parameters."""
+    return apply(ess_tail_block, samples, threads)
+
+
+def ess_mean(samples, threads=None):
+    """Effective sample size for the mean, computed on split chains. See rhat
+    for description of parameters."""
+    return apply(ess_mean_block, samples, threads)
+
+
+def mcse_mean(samples, threads=None):
+    """Monte Carlo standard error of the mean. See rhat for description of
+    parameters."""
+    return apply(mcse_mean_block, samples, threads)
+
+
+def diagnose(samples, threads=None):
+    """Computes all diagnostics at once: 'rhat', 'ess_bulk', 'ess_tail' and
+    'mcse_mean'. See rhat for description of parameters.
+
+    Returns
+    -------
+    dict
+        For array input, a dictionary from diagnostic name to its results.
+        For dictionary input, a dictionary from variable name to such
+        dictionaries.
+    """
+    result = apply(diagnose_block, samples, threads)
+    if isinstance(result, dict):
+        return {k: {name: v[..., i] for i, name in enumerate(DIAGNOSTICS)}
+                for k, v in result.items()}
+    return {name: result[..., i] for i, name in enumerate(DIAGNOSTICS)}
+
+
+def apply(function, samples, threads):
+    """Applies function to samples of each variable. Function receives an
+    array with shape (elements, iterations, chains) and returns an array
+    whose first dimension corresponds to elements. Elements of all variables
+    with the same number of iterations and chains are processed together."""
+    if not isinstance(samples, dict):
+        x, shape = elements(samples)
+        result = apply_elements(function, x, threads)
+        return result.reshape(shape + result.shape[1:])
+    groups = {}
+    for name, value in samples.items():
+        x, shape = elements(value)
+        groups.setdefault(x.shape[1:], []).append((name, x, shape))
+    results = {}
+    for group in groups.values():
+        x = np.concatenate([x for _, x, _ in group])
+        result = apply_elements(function, x, threads)
+        start = 0
+        for name, x, shape in group:
+            part = result[start:start + len(x)]
+            results[name] = part.reshape(shape + part.shape[1:])
+            start += len(x)
+    return results
+
+
+def elements(samples):
+    """Returns samples as an array with shape (elements, iterations, chains)
+    with missing values as NaN, and the shape of elements."""
+    x = np.asarray(np.ma.filled(samples, np.nan), dtype=np.double)
+    if x.ndim < 2:
+        raise ValueError('Samples should have shape '
+                         '(dim_1, ..., dim_n, iterations, chains).')
+    shape = x.shape[:-2]
+    return x.reshape((int(np.prod(shape)),) + x.shape[-2:]), shape
+
+
+def apply_elements(function, x, threads):
+    """Applies function to array with shape (elements, iterations, chains),
+    in multiple threads when it is large."""
+    threads = threads or getattr(os, 'cpu_count', lambda: 1)() or 1
+    if threads > 1 and x.size > THREADS_MIN_SIZE and len(x) > 1:
+        from concurrent.futures import ThreadPoolExecutor
+        blocks = np.array_split(x, min(len(x), 4 * threads))
+        with ThreadPoolExecutor(threads) as executor:
+            result = np.concatenate(list(executor.map(function, blocks)))
+    else:
+        result = function(x)
+    return result
+
+
+def split_draws_required(function):
+    """Returns NaN for all elements instead of calling function, when split
+    chains would have less than two iterations."""
+    def block(x):
+        if x.shape[1] < 4:
+            return np.full(len(x), np.nan)
+        return function(x)
+    return block
+
+
+@split_draws_required
+def rhat_block(x):
+    split = split_chains(x)
+    return rhat_split(split, z_scale(split))
+
+
+@split_draws_required
+def ess_bulk_block(x):
+    return ess_basic(z_scale(split_chains(x)))
+
+
+@split_draws_required
+def ess_tail_block(x):
+    return ess_tail_split(split_chains(x))
+
+
+@split_draws_required
+def ess_mean_block(x):
+    return ess_basic(split_chains(x))
+
+
+@split_draws_required
+def mcse_mean_block(x):
+    return mcse_mean_split(x, split_chains(x))
+
+
+def diagnose_block(x):
+    if x.shape[1] < 4:
+        return np.full((len(x), len(DIAGNOSTICS)), np.nan)
+    # Ranking dominates the cost, split chains are ranked only once.
+    split = split_chains(x)
+    z = z_scale(split)
+    return np.stack([rhat_split(split, z), ess_basic(z),
+                     ess_tail_split(split), mcse_mean_split(x, split)],
+                    axis=-1)
+
+
+def rhat_split(split, z):
+    """Maximum of bulk and tail R-hat of split chains, given their rank
+    normalized draws z."""
+    bulk = rhat_basic(z)
+    tail = rhat_basic(z_scale(fold(split)))
+    return np.fmax(bulk, tail)
+
+
+def ess_tail_split(split):
+    lower = ess_basic(below_quantile(split, 0.05))
+    upper = ess_basic(below_quantile(split, 0.95))
+    return np.fmin(lower, upper)
+
+
+def mcse_mean_split(x, split):
+    sd = draws(x).std(axis=1, ddof=1)
+    return sd / np.sqrt(ess_basic(split))
+
+
+def draws(x):
+    """Combines draws from all chains, returns array (elements, draws)."""
+    return x.reshape(len(x), -1)
+
+
+def split_chains(x):
+    """Splits each chain into two halves. When number of iterations is odd,
+    the middle iteration is discarded."""
+    half = x.shape[1] // 2
+    return np.concatenate((x[:, :half], x[:, x.shape[1] - half:]), axis=2)
+
+
+def fold(x):
+    """Absolute deviations from the median of each element."""
+    median = np.median(draws(x), axis=1)
+    return np.abs(x - median[:, np.newaxis, np.newaxis])
+
+
+def below_quantile(x, q):
+    """Indicators of draws not exceeding given quantile of each element."""
+    quantile = np.percentile(draws(x), 100 * q, axis=1)
+    return (x <= quantile[:, np.newaxis, np.newaxis]).astype(np.double)
+
+
+def rank(x):
+    """Ranks along the last axis starting from 1, with ties given an average
+    rank."""
+    n = x.shape[-1]
+    rows = np.arange(len(x))[:, np.newaxis]
+    order = np.argsort(x, axis=-1, kind='mergesort')
+    values = x[rows, order]
+    position = np.arange(1, n + 1, dtype=np.double)
+    # First and last positions of each group of tied values.
+    first = np.ones(x.shape, dtype=bool)
+    first[:, 1:] = values[:, 1:] != values[:, :-1]
+    last = np.ones(x.shape, dtype=bool)
+    last[:, :-1] = first[:, 1:]
+    start = np.maximum.accumulate(np.where(first, position, 0), axis=-1)
+    end = np.minimum.accumulate(
+        np.where(last, position, n + 1)[:, ::-1], axis=-1)[:, ::-1]
+    ranks = np.empty(x.shape)
+    ranks[rows, order] = (start + end) / 2
+    return ranks
+
+
+def z_scale(x):
+    """Rank normalization: ranks of draws of each element, transformed with
+    inverse of normal distribution function."""
+    s = x.shape[1] * x.shape[2]
+    r = rank(draws(x))
+    z = normal_ppf((r - 3.0 / 8.0) / (s + 1.0 / 4.0))
+    # Elements with missing values remain missing.
+    z[np.isnan(draws(x)).any(axis=1)] = np.nan
+    return z.reshape(x.shape)
+
+
+def rhat_basic(x):
+    n = x.shape[1]
+    if n < 2:
+        return np.full(len(x), np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        chain_mean = x.mean(axis=1)
+        chain_var = x.var(axis=1, ddof=1)
+        w = chain_var.mean(axis=1)
+        b = n * chain_mean.var(axis=1, ddof=1)
+        var_plus = (n - 1.0) / n * w + b / n
+        return np.sqrt(var_plus / w)
+
+
+def autocovariance(x):
+    """Autocovariance of each chain along iterations axis, computed with
+    FFT."""
+    n = x.shape[1]
+    size = 2 ** int(math.ceil(math.log(2 * n - 1, 2))) if n > 1 else 1
+    centered = x - x.mean(axis=1, keepdims=True)
+    f = np.fft.rfft(centered, n=size, axis=1)
+    acov = np.fft.irfft(f * np.conjugate(f), n=size, axis=1)[:, :n]
+    return acov.real / n
+
+
+def ess_basic(x):
+    """Effective sample size using Geyer's initial monotone sequence
+    estimator, combined across chains."""
+    n, m = x.shape[1], x.shape[2]
+    if n < 2:
+        return np.full(len(x), np.nan)
+    acov = autocovariance(x)
+    chain_mean = x.mean(axis=1)
+    mean_var = acov[:, 0, :].mean(axis=1) * n / (n - 1.0)
+    var_plus = mean_var * (n - 1.0) / n
+    if m > 1:
+        var_plus += chain_mean.var(axis=1, ddof=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rho = 1 - (mean_var[:, np.newaxis] - acov.mean(axis=2)) / \
+            var_plus[:, np.newaxis]
+        rho[:, 0] = 1
+        # Sums of autocorrelations at lags 2k and 2k + 1 are positive and
+        # monotonically decreasing for reversible chains. Truncate at the
+        # first negative sum and enforce monotonicity.
+        k = n // 2
+        pairs = rho[:, 0:2 * k:2] + rho[:, 1:2 * k:2]
+        positive = np.cumprod(pairs > 0, axis=1).astype(bool)
+        pairs = np.minimum.accumulate(
+            np.where(positive, pairs, np.inf), axis=1)
+        tau = -1 + 2 * np.where(positive, pairs, 0).sum(axis=1)
+        tau = np.fmax(tau, 1 / math.log10(n * m)) if n * m > 1 else tau
+        ess = n * m / tau
+    ess[~np.isfinite(var_plus) | (var_plus <= 0)] = np.nan
+    return ess
+
+
+def normal_ppf(p):
+    """Inverse of standard normal distribution function, using rational
+    approximation by Peter J. Acklam with relative error below 1.15e-9."""
+    a = [-3.969683028665376e+01, 2.209460984245205e+02,
+         -2.759285104469687e+02, 1.383577518672690e+02,
+         -3.066479806614716e+01, 2.506628277459239e+00]
+    b = [-5.447609879822406e+01, 1.615858368580409e+02,
+         -1.556989798598866e+02, 6.680131188771972e+01,
+         -1.328068155288572e+01]
+    c = [-7.784894002430293e-03, -3.223964580411365e-01,
+         -2.400758277161838e+00, -2.549732539343734e+00,
+         4.374664141464968e+00, 2.938163982698783e+00]
+    d = [7.784695709041462e-03, 3.224671290700398e-01,
+         2.445134137142996e+00, 3.754408661907416e+00]
+    p_low = 0.02425
+
+    p = np.asarray(p, dtype=np.double)
+    result = np.empty_like(p)
+
+    def tail(q):
+        return (((((c[0] * q + c[1]) * q + c[2]) * q + c[3]) * q + c[4]) * q +
+                c[5]) / ((((d[0] * q + d[1]) * q + d[2]) * q + d[3]) * q + 1)
+
+    low = p < p_low
+    high = p > 1 - p_low
+    central = ~(low | high)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        result[low] = tail(np.sqrt(-2 * np.log(p[low])))
+        result[high] = -tail(np.sqrt(-2 * np.log(1 - p[high])))
+        q = p[central] - 0.5
+        r = q * q
+        result[central] = (((((a[0] * r + a[1]) * r + a[2]) * r + a[3]) * r +
+                             a[4]) * r + a[5]) * q / \
+            (((((b[0] * r + b[1]) * r + b[2]) * r + b[3]) * r + b[4]) * r + 1)
+    return result
@@ -9,22 +9,49 @@
 # MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
 # GNU General Public License for more details.
 
-__all__ = ['Model']
+__all__ = ['Model', 'Estimate']
 
 import collections
 import contextlib
 import sys
-import tempfile
+import threading
 
 import numpy as np
 
+from .checkpoint import (Checkpoint, CheckpointDirectory, load_checkpoint,
+                         save_checkpoint)
 from .console import Console, DUMP_ALL, DUMP_DATA, DUMP_PARAMETERS
+from .diagnostics import diagnose
 from .modules import load_module
-from .progressbar import const_time_partition, progress_bar_factory
+from .progressbar import (const_time_partition, deadline_partition,
+                          default_timer, progress_bar_factory)
+from .store import TraceStore, write_chains
+from .summary import Summary
 
 # Special value indicating missing data in JAGS.
 JAGS_NA = -sys.float_info.max*(1-1e-15)
 
+Estimate = collections.namedtuple('Estimate',
+                                  ['seconds', 'bytes', 'variables'])
+Estimate.__doc__ = """Estimated resources needed to sample from a model.
+
+Attributes
+----------
+seconds : float
+    Wall time of sampling.
+bytes : int
+    Memory used by samples of all variables.
+variables : dict
+    Memory used by samples of each variable.
+"""
+
+# Minimum number of draws per chain for which sample_until computes
+# diagnostics. Split chains have then at least two iterations.
+MIN_DIAGNOSE_DRAWS = 4
+
+# Approximate duration of a single update of a chain with dynamic scheduler.
+DYNAMIC_SLICE_SECONDS = 0.01
+
 
 def dict_to_jags(src):
     """Convert Python dictionary with array like values to format suitable
@@ -32,14 +59,14 @@ def dict_to_jags(src):
 
      * Returned arrays have at least one dimension.
      * Empty arrays are removed from the dictionary.
-     * Masked values are replaced with JAGS_NA.
+
+    Masked values and NaNs are replaced with JAGS_NA by the console, while
+    converting arrays.
     """
     dst = {}
     for k, v in src.items():
-        if np.ma.is_masked(v):
-            v = np.ma.array(data=v, dtype=np.double, ndmin=1,
-                            fill_value=JAGS_NA)
-            v = np.ma.filled(v)
+        if np.ma.isMaskedArray(v):
+            v = np.ma.atleast_1d(v)
         else:
             v = np.atleast_1d(v)
         if not np.size(v):
@@ -49,8 +76,9 @@ def dict_to_jags(src):
 
 
 def dict_from_jags(src):
-    """Convert Python dictionary with array like values returned from JAGS to
-    format suitable for use with Python.
+    """Convert Python dictionary with array like values containing JAGS_NA
+    values to format suitable for use with Python. Arrays returned from
+    console are already converted.
 
      * Arrays containing JAGS_NA values are converted to numpy MaskedArray.
     """
@@ -63,6 +91,80 @@ def dict_from_jags(src):
         dst[k] = v
     return dst
 
+def merge_chains(parts):
+    """Merges samples from consecutive groups of chains into a single
+    dictionary. Parts are pairs of chain index and samples, in chain order.
+    """
+    if len(parts) == 1:
+        return parts[0][1]
+    ds = [d for _, d in parts]
+    merged = {}
+    for k in set(k for d in ds for k in d.keys()):
+        vs = [d[k] for d in ds]
+        if any(isinstance(v, np.ma.MaskedArray) for v in vs):
+            merged[k] = np.ma.concatenate(vs, axis=-1)
+        else:
+            merged[k] = np.concatenate(vs, axis=-1)
+    return merged
+
+
+def concatenate_samples(a, b):
+    """Concatenates samples along iteration axis."""
+    if np.ma.isMaskedArray(a) or np.ma.isMaskedArray(b):
+        return np.ma.concatenate((a, b), axis=-2)
+    return np.concatenate((a, b), axis=-2)
+
+
+def convergence(diagnostics, rhat, min_ess):
+    """Summarizes diagnostics of all variables with their worst values, and
+    checks them against convergence targets. Undefined values are ignored."""
+    def worst(name, reduce):
+        values = [d[name].ravel() for d in diagnostics.values()]
+        values = np.concatenate(values) if values else np.empty(0)
+        values = values[~np.isnan(values)]
+        return reduce(values) if len(values) else np.nan
+    result = {
+        'rhat': worst('rhat', np.max),
+        'ess_bulk': worst('ess_bulk', np.min),
+        'ess_tail': worst('ess_tail', np.min),
+        'diagnostics': diagnostics,
+    }
+    result['converged'] = bool(result['rhat'] <= rhat and
+                               result['ess_bulk'] >= min_ess and
+                               result['ess_tail'] >= min_ess)
+    return result
+
+
+def fixed_partition(iterations, size):
+    """Divides iterations into sub-iterations of given size. The last one may
+    be shorter."""
+    while iterations > 0:
+        yield min(iterations, size)
+        iterations -= size
+
+
+def thinned_partition(iterations, thin, partition):
+    """Divides iterations into sub-iterations that are multiples of thinning
+    interval, except possibly for the last one. Monitors created anew for
+    each sub-iteration record then the same samples as a single monitor would.
+
+    Parameters
+    ----------
+    iterations : int
+        A non-negative integer specifying total number of iterations.
+    thin : int
+        A positive integer specifying thinning interval.
+    partition : callable
+        A function that divides given number of samples into an iterable of
+        sample counts, e.g., const_time_partition.
+    """
+    left = iterations
+    for samples in partition(-(-iterations // thin)):
+        steps = min(samples * thin, left)
+        left -= steps
+        yield steps
+
+
 def check_locale_compatibility():
     """Checks that current locale is compatible with JAGS."""
     import locale
@@ -75,29 +177,13 @@ def check_locale_compatibility():
         > locale.setlocale(locale.LC_ALL, 'C')"""
         raise ValueError(textwrap.dedent(msg))
 
-@contextlib.contextmanager
-def model_path(file=None, code=None, encoding='utf-8'):
-    """Utility function returning model path, if necessary creates a
-    new temporary file with a model code written into it.
-    """
-    if file:
-        yield file
-    elif code:
-        if isinstance(code, str):
-            code = code.encode(encoding=encoding)
-        # TODO use separate delete to support Windows?
-        with tempfile.NamedTemporaryFile() as fh:
-            fh.write(code)
-            fh.flush()
-            yield fh.name
-    else:
-        raise ValueError('Either model name or model text must be provided.')
-
-
 class MultiConsole:
 
-    def __init__(self, chains, chains_per_thread):
+    def __init__(self, chains, chains_per_thread, console_factory=Console,
+                 threads=None, scheduler='static'):
         # Multiple consoles that emulate a single JAGS console.
+        self.threads = threads
+        self.scheduler = scheduler
         self.consoles = []
         self.chains_per_console = []
         # Map from outer chain number to inner console and its inner chain number.
@@ -106,7 +192,7 @@ class MultiConsole:
 
         outer_chain = 1
         while chains > 0:
-            console = Console()
+            console = console_factory()
             console_chains = min(chains_per_thread, chains)
 
             self.consoles.append(console)
@@ -118,14 +204,50 @@ class MultiConsole:
 
             chains -= chains_per_thread
 
+        # With static scheduler each console is used from its own thread,
+        # with dynamic scheduler consoles share a pool of threads. Threads
+        # are created on first use and kept until close. At most threads
+        # consoles are busy at once.
+        self.executors = None
+        self.slots = threading.Semaphore(threads or len(self.consoles))
+
+    def submit(self, index, function, *args):
+        """Schedules call of function with given arguments in the thread of
+        console with given index. Returns a future."""
+        if self.executors is None:
+            from concurrent.futures import ThreadPoolExecutor
+            if self.scheduler == 'dynamic':
+                executor = ThreadPoolExecutor(self.threads or
+                                              len(self.consoles))
+                self.executors = [executor] * len(self.consoles)
+            else:
+                self.executors = [ThreadPoolExecutor(1)
+                                  for _ in self.consoles]
+
+        def call():
+            with self.slots:
+                return function(*args)
+        return self.executors[index].submit(call)
+
+    def map(self, function, *iterables):
+        """Calls function concurrently for each console and corresponding
+        elements of iterables. Returns a list of results."""
+        args = zip(*iterables) if iterables else [()] * len(self.consoles)
+        futures = [self.submit(index, function, console, *a)
+                   for index, (console, a) in enumerate(zip(self.consoles,
+                                                            args))]
+        return [future.result() for future in futures]
+
     def checkModel(self, path):
-        for c in self.consoles:
-            c.checkModel(path)
+        self.map(lambda c: c.checkModel(path))
+
+    def checkModelFromString(self, code):
+        self.map(lambda c: c.checkModelFromString(code))
 
     def compile(self, data, chains, generate_data):
         assert(chains == len(self.chains))
-        for console, chains in zip(self.consoles, self.chains_per_console):
-            console.compile(data, chains, generate_data)
+        self.map(lambda c, chains: c.compile(data, chains, generate_data),
+                 self.chains_per_console)
 
     def setRNGname(self, name, chain):
         console, chain = self.chains[chain]
@@ -144,17 +266,36 @@ class MultiConsole:
             c.clearMonitor(name, monitor_type)
 
     def dumpMonitors(self, monitor_type, flat):
-        ds = [c.dumpMonitors(monitor_type, flat) for c in self.consoles]
-        return {k: np.concatenate([d[k] for d in ds], axis=-1)
-                for k in set(k for d in ds for k in d.keys())}
+        return merge_chains(self.dumpMonitorParts(monitor_type, flat))
+
+    def dumpMonitorParts(self, monitor_type, flat):
+        """Dumps monitors of each console separately. Returns a list of pairs
+        with 0-based index of the first chain of the console and its samples.
+        """
+        parts = []
+        chain = 0
+        for console, chains in zip(self.consoles, self.chains_per_console):
+            parts.append((chain, console.dumpMonitors(monitor_type, flat)))
+            chain += chains
+        return parts
 
     def initialize(self):
+        self.map(lambda c: c.initialize())
+
+    def clearModel(self):
         for c in self.consoles:
-            c.initialize()
+            c.clearModel()
 
     def isAdapting(self):
         return any(c.isAdapting() for c in self.consoles)
 
+    def adaptOff(self):
+        for c in self.consoles:
+            c.adaptOff()
+
+    def iter(self):
+        return self.consoles[0].iter()
+
     def checkAdaptation(self):
         return any(c.checkAdaptation() for c in self.consoles)
 
@@ -165,6 +306,16 @@ class MultiConsole:
         console, chain = self.chains[chain]
         return console.dumpState(type, chain)
 
+    def close(self):
+        if self.executors is not None:
+            for executor in set(self.executors):
+                executor.shutdown()
+            self.executors = None
+        for c in self.consoles:
+            close = getattr(c, 'close', None)
+            if close is not None:
+                close()
+
 
 class Model:
     """High level representation of JAGS model.
@@ -184,7 +335,8 @@ class Model:
     Note
     ----
     The JAGS supports data sets where some of observations have no value.
-    In PyJAGS those missing values are described using numpy MaskedArray.
+    In PyJAGS those missing values are described using numpy MaskedArray
+    or NaN values.
     For example, to create a model with observations x[1] = 0.25, x[3] = 0.75,
     and observation x[2] missing, we would provide following data to Model
     constructor:
@@ -205,7 +357,8 @@ class Model:
     def __init__(self, code=None, data=None, init=None, chains=4, adapt=1000,
                  file=None, encoding='utf-8', generate_data=True,
                  progress_bar=True, refresh_seconds=None,
-                 threads=1, chains_per_thread=1):
+                 threads=1, chains_per_thread=1, backend='thread',
+                 scheduler='static'):
         """
         Create a JAGS model and run adaptation steps.
 
@@ -248,34 +401,110 @@ class Model:
             When model code is provided as a string, this specifies its encoding.
         progress_bar : bool, optional
             If true, enables the progress bar.
-        threads: int, 1 by default
+        threads: int or 'auto', 1 by default
             A positive integer specifying number of threads used to sample from
             model. Using more than one thread is experimental functionality.
+            With 'auto', short pilot runs in adaptive mode measure speed of
+            several combinations of threads and chains_per_thread, and the
+            fastest one is used. Measured combinations are available in
+            layouts attribute, and the choice is logged to 'pyjags' logger.
         chains_per_thread: int, 1 by default
             A positive integer specifying a maximum number of chains sampled in
             a single thread. Takes effect only when using more than one thread.
+        backend: {'thread', 'process'}, 'thread' by default
+            Specifies how chains are sampled when using more than one thread.
+            With 'thread' all chains are sampled in the current process. With
+            'process' each group of chains_per_thread chains is sampled by a
+            separate worker process with its own JAGS console. Worker
+            processes are stopped by close method.
+        scheduler: {'static', 'dynamic'}, 'static' by default
+            Specifies how chains are assigned to threads when using more than
+            one thread. With 'static' each group of chains_per_thread chains
+            is updated by its own thread. With 'dynamic' each chain is
+            updated in short slices, scheduled on a pool of threads, so that
+            threads are not idle while slower chains are still updating.
+            Option chains_per_thread is ignored.
         """
 
         check_locale_compatibility()
 
+        if backend not in ('thread', 'process'):
+            raise ValueError(
+                'Backend should be either \'thread\' or \'process\'.')
+        if scheduler not in ('static', 'dynamic'):
+            raise ValueError(
+                'Scheduler should be either \'static\' or \'dynamic\'.')
+        if not file and not code:
+            raise ValueError('Either model name or model text must be provided.')
+
+        # Measured layouts when threads are selected automatically.
+        self.layouts = None
+        if threads == 'auto':
+            from .autotune import tune_layout
+
+            def create(threads, chains_per_thread):
+                return Model(code=code, data=data, init=init, chains=chains,
+                             adapt=0, file=file, encoding=encoding,
+                             generate_data=generate_data, progress_bar=False,
+                             threads=threads,
+                             chains_per_thread=chains_per_thread,
+                             backend=backend, scheduler=scheduler)
+
+            best, self.layouts = tune_layout(create, chains)
+            threads = best.threads
+            chains_per_thread = best.chains_per_thread
+        if scheduler == 'dynamic':
+            chains_per_thread = 1
+
         # Ensure that default modules are loaded.
         load_module('basemod')
         load_module('bugs')
         load_module('lecuyer')
+        load_module('pyjags')
 
         self.refresh_seconds = refresh_seconds or 0.5 if sys.stdout.isatty() else 5.0
         self.progress_bar = progress_bar_factory(progress_bar, refresh_seconds=self.refresh_seconds)
         self.chains = chains
         self.threads = threads
+        self.backend = backend
+        self.scheduler = scheduler
         self.use_threads = self.threads > 1 and chains_per_thread < self.chains
+        # Arguments needed to create the model anew when unpickling.
+        self._data = data
+        self._generate_data = generate_data
+        # Adaptation steps repeated when resuming from a checkpoint.
+        self._adapt = adapt
+        self._options = dict(progress_bar=progress_bar,
+                             refresh_seconds=refresh_seconds,
+                             threads=threads,
+                             chains_per_thread=chains_per_thread,
+                             backend=backend,
+                             scheduler=scheduler)
+        # Iterations done before the model was restored from a checkpoint.
+        self.iteration_offset = 0
+        # Thread updating a single console, created on first use.
+        self._executor = None
 
         if self.use_threads:
-            self.console = MultiConsole(self.chains, chains_per_thread)
+            if self.backend == 'process':
+                from .process import ProcessConsole
+                console_factory = ProcessConsole
+            else:
+                console_factory = Console
+            self.console = MultiConsole(self.chains, chains_per_thread,
+                                        console_factory, self.threads,
+                                        self.scheduler)
         else:
             self.console = Console()
 
-        with model_path(file, code, encoding) as path:
-            self.console.checkModel(path)
+        if file:
+            self.console.checkModel(file)
+        else:
+            if isinstance(code, str):
+                code = code.encode(encoding=encoding)
+            self.console.checkModelFromString(code)
+        self._code = code
+        self._file = file
 
         self._init_compile(data, generate_data)
         self._init_parameters(init)
@@ -283,7 +512,43 @@ class Model:
         if adapt:
             self.adapt(adapt)
 
-    def _init_compile(self, data, generate_data):
+    def with_data(self, data, init=None, adapt=1000, generate_data=None):
+        """
+        Compiles the model anew with different data, reusing already parsed
+        model code, and runs adaptation steps. Useful when fitting the same
+        model to many data sets, as only compilation is repeated.
+
+        Parameters
+        ----------
+        data : dict
+            Dictionary with observed nodes in the model, see Model.
+        init : dict or list of dicts, optional
+            Initial values for parameters, see Model.
+        adapt : int, 1000 by default
+            An integer specifying number of adaptations steps.
+        generate_data : bool, optional
+            If true, data block in the model is used to generate data. By
+            default, the same as when model was created.
+
+        Returns
+        -------
+        Model
+            This model, for convenience.
+        """
+        if generate_data is None:
+            generate_data = self._generate_data
+        self._init_compile(data, generate_data, clear=True)
+        self._data = data
+        self._generate_data = generate_data
+        self._adapt = adapt
+        self.iteration_offset = 0
+        self._init_parameters(init)
+        self.console.initialize()
+        if adapt:
+            self.adapt(adapt)
+        return self
+
+    def _init_compile(self, data, generate_data, clear=False):
         if data is None:
             data = {}
         data = dict_to_jags(data)
@@ -291,6 +556,9 @@ class Model:
         if unused:
             raise ValueError(
                 'Unused data for variables: {}'.format(','.join(unused)))
+        if clear:
+            # Parsed model code is retained.
+            self.console.clearModel()
         self.console.compile(data, self.chains, generate_data)
 
 
@@ -331,52 +599,224 @@ class Model:
             self.console.setParameters(data, chain)
 
     def _update(self, iterations, header):
+        with self.progress_bar(self.chains * iterations, header=header) as pb:
+            self._update_progress(pb, iterations)
+
+    def _update_progress(self, progress, iterations):
         if self.use_threads:
-            method = self._update_parallel
+            consoles = list(zip(self.console.consoles,
+                                self.console.chains_per_console))
         else:
-            method = self._update_sequential
-
-        with self.progress_bar(self.chains * iterations, header=header) as pb:
-            method(pb, iterations)
+            consoles = [(self.console, self.chains)]
+        if self.use_threads and self.scheduler == 'dynamic':
+            self._update_dynamic(progress, iterations)
+        elif all(isinstance(console, Console) for console, _ in consoles):
+            self._update_native(progress, iterations, consoles)
+        else:
+            # Consoles in worker processes are busy during update, and can't
+            # report progress. Update them in chunks instead.
+            self._update_parallel(progress, iterations)
+
+    def _update_native(self, progress, iterations, consoles):
+        """Updates consoles in a single call to each console, while progress
+        is polled from consoles. Consoles of MultiConsole are updated in their
+        threads, a single console in the worker thread of the model, kept
+        until close. On KeyboardInterrupt consoles are interrupted after
+        current iteration.
+        """
+        done = [None] * len(consoles)
+        finished = [threading.Event() for _ in consoles]
+        errors = []
 
-    def _update_sequential(self, progress, iterations):
-        for steps in const_time_partition(iterations, self.refresh_seconds):
-            self.console.update(steps)
-            progress.update(self.chains * steps)
+        def update(index, console):
+            try:
+                done[index] = console.update(iterations)
+            except Exception as err:
+                errors.append(err)
+                done[index] = 0
+            finally:
+                finished[index].set()
+
+        reported = [0] * len(consoles)
+
+        def report():
+            for index, (console, chains) in enumerate(consoles):
+                current = done[index]
+                if current is None:
+                    current = console.progress()
+                if current > reported[index]:
+                    progress.update(chains * (current - reported[index]))
+                    reported[index] = current
 
-    def _update_parallel(self, progress, iterations):
-        from concurrent.futures import ALL_COMPLETED, ThreadPoolExecutor, wait
-        from threading import Event
-
-        with ThreadPoolExecutor(self.threads) as executor:
-            # Event used to interrupt inner threads (which are
-            # non-interruptable by default).
-            interrupt = Event()
-
-            def update(console, chains):
-                for steps in const_time_partition(iterations, self.refresh_seconds):
-                    if interrupt.is_set():
-                        break
-                    console.update(steps)
-                    progress.update(chains * steps)
-            fs = [executor.submit(update, console, chains)
-                  for console, chains in zip(self.console.consoles,
-                                             self.console.chains_per_console)]
+        if self.use_threads:
+            for index, (console, _) in enumerate(consoles):
+                self.console.submit(index, update, index, console)
+        else:
+            if self._executor is None:
+                from concurrent.futures import ThreadPoolExecutor
+                self._executor = ThreadPoolExecutor(1)
+            self._executor.submit(update, 0, self.console)
+        try:
+            for event in finished:
+                while not event.wait(self.refresh_seconds):
+                    report()
+        except KeyboardInterrupt:
+            for console, _ in consoles:
+                console.interrupt()
+            for event in finished:
+                event.wait()
+            for console, _ in consoles:
+                console.interrupt(False)
+            raise
+        report()
+        if errors:
+            raise errors[0]
+
+    def _update_dynamic(self, progress, iterations):
+        """Updates each console, holding a single chain, in slices of about
+        DYNAMIC_SLICE_SECONDS. After each slice, next slice of the console is
+        queued to the pool of threads shared by all consoles.
+        """
+        if not iterations:
+            return
+        consoles = self.console.consoles
+        remaining = [iterations] * len(consoles)
+        pending = [len(consoles)]
+        lock = threading.Lock()
+        finished = threading.Event()
+        interrupt = threading.Event()
+        errors = []
+
+        def update(index, steps):
             try:
-                (done, not_done) = wait(fs, return_when=ALL_COMPLETED)
-                for d in done:
-                    d.result()
-                for d in not_done:
-                    assert(False)
-            except KeyboardInterrupt:
+                start = default_timer()
+                done = consoles[index].update(steps)
+                elapsed = default_timer() - start
+                progress.update(done)
+                remaining[index] -= done
+            except Exception as err:
+                errors.append(err)
                 interrupt.set()
-                raise
+            if remaining[index] > 0 and not interrupt.is_set():
+                if elapsed > 0:
+                    steps = int(DYNAMIC_SLICE_SECONDS * done / elapsed)
+                steps = max(1, min(steps, 2 * done, remaining[index]))
+                self.console.submit(index, update, index, steps)
+                return
+            with lock:
+                pending[0] -= 1
+                if not pending[0]:
+                    finished.set()
+
+        for index in range(len(consoles)):
+            self.console.submit(index, update, index, 1)
+        try:
+            while not finished.wait(self.refresh_seconds):
+                pass
+        except KeyboardInterrupt:
+            interrupt.set()
+            native = [c for c in consoles if isinstance(c, Console)]
+            for console in native:
+                console.interrupt()
+            finished.wait()
+            for console in native:
+                console.interrupt(False)
+            raise
+        if errors:
+            raise errors[0]
 
-    def update(self, iterations):
-        """Updates the model for given number of iterations."""
-        self._update(iterations, 'updating: ')
+    def _update_parallel(self, progress, iterations):
+        from concurrent.futures import wait
+
+        # Event used to interrupt inner threads (which are non-interruptable
+        # by default).
+        interrupt = threading.Event()
+
+        def update(console, chains):
+            for steps in const_time_partition(iterations,
+                                              self.refresh_seconds):
+                if interrupt.is_set():
+                    break
+                console.update(steps)
+                progress.update(chains * steps)
+
+        fs = [self.console.submit(index, update, console, chains)
+              for index, (console, chains) in enumerate(zip(
+                  self.console.consoles, self.console.chains_per_console))]
+        try:
+            wait(fs)
+            for f in fs:
+                f.result()
+        except KeyboardInterrupt:
+            interrupt.set()
+            raise
+
+    def update(self, iterations, checkpoint_every=None, checkpoint_dir=None,
+               resume=False):
+        """
+        Updates the model for given number of iterations.
 
-    def sample(self, iterations, vars=None, thin=1, monitor_type="trace"):
+        Parameters
+        ----------
+        iterations : int
+            A positive integer specifying number of iterations.
+        checkpoint_every : int, optional
+            Number of iterations between checkpoints of the model, which are
+            written to checkpoint_dir, see Model.checkpoint.
+        checkpoint_dir : str, optional
+            A directory where checkpoints are written. Created if necessary.
+        resume : bool, optional
+            If true and checkpoint_dir contains a checkpoint of an update with
+            the same number of iterations, e.g., one that was interrupted,
+            the update is resumed from the latest checkpoint. The model should
+            be created the same way as the interrupted one.
+        """
+        if checkpoint_every is None and checkpoint_dir is None:
+            self._update(iterations, 'updating: ')
+            return
+        job = {'kind': np.array('update'), 'iterations': np.array(iterations)}
+        directory, done = self._start_job(checkpoint_every, checkpoint_dir,
+                                          resume, job)
+        with self.progress_bar(self.chains * (iterations - done),
+                               header='updating: ') as progress:
+            for steps in fixed_partition(iterations - done, checkpoint_every):
+                self._update_progress(progress, steps)
+                directory.save(self._checkpoint_state())
+
+    def update_async(self, iterations):
+        """
+        Updates the model for given number of iterations without blocking
+        asyncio event loop. Requires Python 3.5 or later.
+
+        Returns
+        -------
+        pyjags.aio.AsyncRun
+            Awaitable run, which can be also iterated over with ``async for``
+            to receive progress.
+        """
+        from .aio import AsyncRun
+        return AsyncRun(self, iterations, sample=False)
+
+    def sample_async(self, iterations, vars=None, thin=1,
+                     monitor_type="trace"):
+        """
+        Samples the model without blocking asyncio event loop. Requires
+        Python 3.5 or later. See sample for description of parameters.
+
+        Returns
+        -------
+        pyjags.aio.AsyncRun
+            Awaitable run, which gives samples in the same format as returned
+            from sample. It can be also iterated over with ``async for`` to
+            receive progress.
+        """
+        from .aio import AsyncRun
+        return AsyncRun(self, iterations, vars, thin, monitor_type)
+
+    def sample(self, iterations=None, vars=None, thin=1, monitor_type="trace",
+               out=None, iteration_offset=0, chain_offset=0, store=None,
+               checkpoint_every=None, checkpoint_dir=None, resume=False,
+               seconds=None, max_iterations=None):
         """
         Creates monitors for given variables, runs the model for provided
         number of iterations and returns monitored samples.
@@ -384,34 +824,490 @@ class Model:
 
         Parameters
         ----------
-        iterations : int
-            A positive integer specifying number of iterations.
+        iterations : int, optional
+            A positive integer specifying number of iterations. Required,
+            unless seconds is given.
         vars : list of str, optional
             A list of variables to monitor.
         thin : int, optional
             A positive integer specifying thinning interval.
+        monitor_type : str, optional
+            Type of monitors used, "trace" by default. Besides monitor types
+            from JAGS modules, following types are available:
+
+             * "moments" keeps only mean and standard deviation of each node,
+               values have shape (dim_1, ..., dim_n, 2, chains).
+             * "histogram" keeps only histogram of each node, values have
+               shape (dim_1, ..., dim_n, 102, chains), where along the second
+               to last dimension are: lower bound of the first bin, width of
+               bins, and counts in 100 bins.
+
+            Both compute statistics inside JAGS, using memory independent of
+            the number of iterations. Options out and store can be used only
+            with "trace" monitors.
+        out : dict, optional
+            Preallocated arrays, e.g., numpy.memmap, where samples will be
+            written instead of newly allocated ones. Keys are variable names
+            and values are arrays with shape (dim_1, dim_n, iterations,
+            chains), where the last two dimensions are large enough to hold
+            samples at given offsets. By default monitors all variables
+            from out.
+        iteration_offset : int, optional
+            Index along iteration axis of out where samples are written.
+        chain_offset : int, optional
+            Index along chain axis of out where samples are written.
+        store : str, optional
+            A directory where samples are written as .npy files, one per
+            variable, instead of being kept in memory. See TraceStore.
+            Missing values are stored as JAGS_NA.
+        checkpoint_every : int, optional
+            Number of iterations between checkpoints. At each checkpoint,
+            state of the model, see Model.checkpoint, and samples collected so
+            far are written to checkpoint_dir. Samples are kept there as in
+            store directory.
+        checkpoint_dir : str, optional
+            A directory where checkpoints are written. Created if necessary.
+        resume : bool, optional
+            If true and checkpoint_dir contains a checkpoint of sampling with
+            the same iterations, vars and thin, e.g., one that was
+            interrupted, sampling is resumed from the latest checkpoint, and
+            returned samples include those collected before the interruption.
+            The model should be created the same way as the interrupted one.
+        seconds : float, optional
+            Time budget. Instead of running a fixed number of iterations,
+            samples in chunks until the next chunk is estimated to finish
+            after given number of seconds, and returns samples collected so
+            far. All chains have the same number of samples. Can be used only
+            with "trace" monitors, and without out, store or checkpoints.
+        max_iterations : int, optional
+            Maximum number of iterations when seconds is given.
         Returns
         -------
         dict
             Sampled values of monitored variables as a dictionary where keys
             are variable names and values are numpy arrays with shape:
             (dim_1, dim_n, iterations, chains). dim_1, ..., dim_n describe the
-            shape of variable in JAGS model.
+            shape of variable in JAGS model. When out is given, values are
+            views of written parts of out. When store or checkpoint_dir is
+            given, values are memory-mapped arrays.
         """
+        if seconds is not None:
+            if iterations is not None:
+                raise ValueError(
+                    'Only one of iterations and seconds may be provided.')
+            if (out is not None or store is not None or
+                    checkpoint_every is not None or
+                    checkpoint_dir is not None or monitor_type != 'trace'):
+                raise ValueError(
+                    'Time budget can be used only with trace monitors, and '
+                    'without out, store or checkpoints.')
+            return self._sample_deadline(seconds, max_iterations, vars, thin)
+        if iterations is None:
+            raise ValueError('Either iterations or seconds must be provided.')
+        if out is not None and store is not None:
+            raise ValueError('Only one of out and store may be provided.')
+        if monitor_type != 'trace' and (
+                out is not None or store is not None or
+                checkpoint_every is not None or checkpoint_dir is not None):
+            raise ValueError(
+                'Options out, store and checkpoints can be used only with '
+                'trace monitors.')
+        if checkpoint_every is not None or checkpoint_dir is not None:
+            if out is not None or store is not None:
+                raise ValueError(
+                    'Checkpoints can not be used with out or store.')
+            return self._sample_checkpointed(iterations, vars, thin,
+                                             monitor_type, checkpoint_every,
+                                             checkpoint_dir, resume)
+        if store is not None:
+            return self._sample_store(iterations, vars, thin, monitor_type,
+                                      store)
+        if out is not None:
+            return self._sample_out(iterations, vars, thin, monitor_type, out,
+                                    iteration_offset, chain_offset)
         if vars is None:
             vars = self.variables
+        with self._monitors(vars, thin, monitor_type):
+            self._update(iterations, 'sampling: ')
+            samples = self.console.dumpMonitors(monitor_type, False)
+        return samples
+
+    def _sample_out(self, iterations, vars, thin, monitor_type, out,
+                    iteration_offset, chain_offset):
+        if vars is None:
+            vars = list(out.keys())
+        missing = set(vars) - set(out.keys())
+        if missing:
+            raise ValueError(
+                'Missing output arrays for variables: {}'.format(
+                    ','.join(missing)))
+        self._check_out(out, vars, iterations, thin, iteration_offset,
+                        chain_offset)
+        with self._monitors(vars, thin, monitor_type):
+            self._update(iterations, 'sampling: ')
+            parts = self._dump_monitor_parts(monitor_type)
+        n = write_chains(out, parts, iteration_offset, chain_offset)
+        iterations = slice(iteration_offset, iteration_offset + n)
+        chains = slice(chain_offset, chain_offset + self.chains)
+        return dict_from_jags({k: out[k][..., iterations, chains]
+                               for k in vars})
+
+    def _check_out(self, out, vars, iterations, thin, iteration_offset,
+                   chain_offset):
+        """Checks that arrays from out can hold samples at given offsets,
+        before the model is updated."""
+        size = (iteration_offset + -(-iterations // thin),
+                chain_offset + self.chains)
+        # Dimensions of variables, unknown for variables without values.
+        state = self.console.dumpState(DUMP_ALL, 1)
+        for name in vars:
+            shape = np.shape(out[name])
+            dims = np.shape(state[name]) if name in state else shape[:-2]
+            # Dimensions of length one may be omitted.
+            if (len(shape) < 2 or shape[-2] < size[0] or
+                    shape[-1] < size[1] or
+                    [d for d in shape[:-2] if d != 1] !=
+                    [d for d in dims if d != 1]):
+                raise ValueError(
+                    'Output array for variable {} has shape {}, but shape '
+                    '{} is required.'.format(name, shape,
+                                             tuple(dims) + size))
+
+    def _sample_store(self, iterations, vars, thin, monitor_type, store):
+        if vars is None:
+            vars = self.variables
+        traces = TraceStore(store, -(-iterations // thin), self.chains)
+        chunks = thinned_partition(
+            iterations, thin,
+            lambda samples: const_time_partition(samples,
+                                                 self.refresh_seconds))
+        iteration = 0
+        for parts in self._sample_chunks(iterations, chunks, vars, thin,
+                                         monitor_type):
+            iteration += traces.write(parts, iteration)
+        traces.flush()
+        return dict(traces.arrays)
+
+    def _sample_deadline(self, seconds, max_iterations, vars, thin):
+        if vars is None:
+            vars = self.variables
+        progress_bar = None
+        if max_iterations is None:
+            # Total number of iterations is unknown.
+            max_iterations = sys.maxsize
+            progress_bar = progress_bar_factory(False)
+        chunks = thinned_partition(
+            max_iterations, thin,
+            lambda samples: deadline_partition(samples, seconds,
+                                               self.refresh_seconds))
+        samples = collections.defaultdict(list)
+        for parts in self._sample_chunks(max_iterations, chunks, vars, thin,
+                                         "trace", progress_bar):
+            for name, values in merge_chains(parts).items():
+                samples[name].append(values)
+        result = {}
+        for name, values in samples.items():
+            if any(np.ma.isMaskedArray(v) for v in values):
+                result[name] = np.ma.concatenate(values, axis=-2)
+            else:
+                result[name] = np.concatenate(values, axis=-2)
+        return result
+
+    def _sample_checkpointed(self, iterations, vars, thin, monitor_type,
+                             checkpoint_every, checkpoint_dir, resume):
+        if vars is None:
+            vars = self.variables
+        job = {
+            'kind': np.array('sample'),
+            'iterations': np.array(iterations),
+            'thin': np.array(thin),
+            'vars': np.array(sorted(vars)),
+            'monitor_type': np.array(monitor_type),
+        }
+        directory, done = self._start_job(checkpoint_every, checkpoint_dir,
+                                          resume, job)
+        traces = TraceStore(checkpoint_dir, -(-iterations // thin),
+                            self.chains, resume=done > 0)
+        chunk_samples = max(1, checkpoint_every // thin)
+        chunks = thinned_partition(
+            iterations - done, thin,
+            lambda samples: fixed_partition(samples, chunk_samples))
+        # Iterations done are a multiple of thin, unless all are done.
+        iteration = -(-done // thin)
+        for parts in self._sample_chunks(iterations - done, chunks, vars,
+                                         thin, monitor_type):
+            iteration += traces.write(parts, iteration)
+            traces.flush()
+            directory.save(self._checkpoint_state())
+        traces.load(vars)
+        return dict(traces.arrays)
+
+    def sample_iter(self, iterations, vars=None, thin=1, chunk=1000,
+                    monitor_type="trace"):
+        """
+        Runs the model for provided number of iterations, yielding monitored
+        samples in chunks. Monitors are cleared after each chunk, so memory
+        used by samples is bounded by the chunk size, not by the total number
+        of iterations.
+
+        Parameters
+        ----------
+        iterations : int
+            A positive integer specifying number of iterations.
+        vars : list of str, optional
+            A list of variables to monitor.
+        thin : int, optional
+            A positive integer specifying thinning interval.
+        chunk : int, optional
+            A positive integer specifying number of iterations per chunk.
+            It is rounded down to a multiple of thin (but not below thin).
+        monitor_type : str, optional
+            Type of monitors used, "trace" by default, see sample. Monitors
+            are created anew for each chunk, so "moments" and "histogram"
+            monitors give statistics of samples from each chunk separately.
+
+        Yields
+        ------
+        dict
+            Sampled values of monitored variables in the same format as
+            returned from sample. With "trace" monitors, concatenating chunks
+            along iteration axis gives samples that sample would return.
+        """
+        if vars is None:
+            vars = self.variables
+        chunk_samples = max(1, chunk // thin)
+        chunks = thinned_partition(
+            iterations, thin,
+            lambda samples: fixed_partition(samples, chunk_samples))
+        for parts in self._sample_chunks(iterations, chunks, vars, thin,
+                                         monitor_type):
+            yield merge_chains(parts)
+
+    def summarize(self, iterations, vars=None, thin=1,
+                  quantiles=(0.025, 0.5, 0.975), chunk=1000, k=200):
+        """
+        Runs the model for provided number of iterations and returns summary
+        statistics of monitored variables, without keeping their samples.
+        Samples are processed in chunks, so memory used is bounded by the
+        chunk size and the number of monitored nodes.
+
+        Parameters
+        ----------
+        iterations : int
+            A positive integer specifying number of iterations.
+        vars : list of str, optional
+            A list of variables to monitor.
+        thin : int, optional
+            A positive integer specifying thinning interval.
+        quantiles : sequence of floats, optional
+            Probabilities of quantiles to estimate.
+        chunk : int, optional
+            A positive integer specifying number of iterations per chunk.
+        k : int, optional
+            Size of quantile sketches, see pyjags.summary.QuantileSketch.
+
+        Returns
+        -------
+        dict
+            Summary of all chains. Keys are variable names and values are
+            dictionaries with 'mean' and 'sd' arrays with shape (dim_1, ...,
+            dim_n), and 'quantiles' array with shape (dim_1, ..., dim_n,
+            len(quantiles)). Elements with missing values are masked.
+        """
+        if vars is None:
+            vars = self.variables
+        chunk_samples = max(1, chunk // thin)
+        chunks = thinned_partition(
+            iterations, thin,
+            lambda samples: fixed_partition(samples, chunk_samples))
+        # Summaries are accumulated separately for each group of chains, and
+        # merged at the end.
+        summaries = collections.defaultdict(dict)
+        for parts in self._sample_chunks(iterations, chunks, vars, thin,
+                                         "trace"):
+            for chain, part in parts:
+                for name, samples in part.items():
+                    summary = summaries[name].get(chain)
+                    if summary is None:
+                        summary = Summary(samples.shape[:-2], k)
+                        summaries[name][chain] = summary
+                    summary.update(samples)
+        result = {}
+        for name, parts in summaries.items():
+            parts = [parts[chain] for chain in sorted(parts)]
+            for summary in parts[1:]:
+                parts[0].merge(summary)
+            result[name] = parts[0].result(quantiles)
+        return result
+
+    def sample_until(self, max_iterations, rhat=1.01, min_ess=400, vars=None,
+                     thin=1, chunk=1000):
+        """
+        Runs the model in chunks until convergence targets are met, or until
+        max_iterations are done. After each chunk, diagnostics are computed
+        from all samples collected so far, see pyjags.diagnostics.
+
+        Targets are met when R-hat of every element of monitored variables is
+        at most rhat, and both bulk and tail effective sample sizes are at
+        least min_ess. Elements for which diagnostics are undefined, e.g.,
+        constant nodes, are ignored.
+
+        Parameters
+        ----------
+        max_iterations : int
+            A positive integer specifying maximum number of iterations.
+        rhat : float, optional
+            Maximum acceptable R-hat.
+        min_ess : float, optional
+            Minimum acceptable effective sample size.
+        vars : list of str, optional
+            A list of variables to monitor.
+        thin : int, optional
+            A positive integer specifying thinning interval.
+        chunk : int, optional
+            A positive integer specifying number of iterations between
+            diagnostics.
+
+        Returns
+        -------
+        samples : dict
+            All sampled values, in the same format as returned from sample.
+        history : list of dict
+            Diagnostics computed after each chunk. Each entry contains number
+            of 'iterations' done so far, the worst 'rhat', 'ess_bulk' and
+            'ess_tail' across all monitored elements, whether targets were
+            'converged', and 'diagnostics' of each variable as returned from
+            pyjags.diagnostics.diagnose. Until each chain has at least
+            MIN_DIAGNOSE_DRAWS draws, diagnostics are skipped, worst values
+            are NaN, and 'diagnostics' is empty.
+        """
+        if vars is None:
+            vars = self.variables
+        chunk_samples = max(1, chunk // thin)
+        chunks = thinned_partition(
+            max_iterations, thin,
+            lambda samples: fixed_partition(samples, chunk_samples))
+        samples = {}
+        history = []
+        for parts in self._sample_chunks(max_iterations, chunks, vars, thin,
+                                         "trace"):
+            for name, values in merge_chains(parts).items():
+                if name in samples:
+                    values = concatenate_samples(samples[name], values)
+                samples[name] = values
+            draws = min(v.shape[-2] for v in samples.values()) \
+                if samples else 0
+            if draws < MIN_DIAGNOSE_DRAWS:
+                # Too few draws in split chains, diagnostics are undefined.
+                entry = convergence({}, rhat, min_ess)
+            else:
+                entry = convergence(diagnose(samples), rhat, min_ess)
+            entry['iterations'] = min(
+                (len(history) + 1) * chunk_samples * thin, max_iterations)
+            history.append(entry)
+            if entry['converged']:
+                break
+        return samples, history
+
+    def estimate(self, iterations, vars=None, thin=1, seconds=1.0):
+        """
+        Estimates time and memory needed to sample from the model, using a
+        short probe run. The probe samples given variables for about given
+        number of seconds, and its samples are discarded. The probe updates
+        the model, like burn-in iterations do.
+
+        Time is extrapolated from the time per iteration of the probe, which
+        includes the cost of monitors. Memory is computed from the shapes of
+        sampled variables, for samples returned from sample with "trace"
+        monitors, i.e., 8 bytes per element, iteration kept after thinning,
+        and chain. Masks of variables with missing values are not included.
+
+        Parameters
+        ----------
+        iterations : int
+            A positive integer specifying number of iterations to estimate
+            for.
+        vars : list of str, optional
+            A list of variables to monitor.
+        thin : int, optional
+            A positive integer specifying thinning interval.
+        seconds : float, optional
+            Approximate duration of the probe.
+
+        Returns
+        -------
+        Estimate
+            Estimated seconds, total bytes, and bytes of each variable.
+        """
+        if vars is None:
+            vars = self.variables
+        probed = []
+
+        def partition(samples):
+            for n in deadline_partition(samples, seconds, seconds / 4):
+                probed.append(n * thin)
+                yield n
+
+        chunks = thinned_partition(sys.maxsize, thin, partition)
+        elements = {}
+        start = default_timer()
+        for parts in self._sample_chunks(sys.maxsize, chunks, vars, thin,
+                                         "trace", progress_bar_factory(False)):
+            for name, values in parts[0][1].items():
+                elements[name] = int(np.prod(values.shape[:-2]))
+        elapsed = default_timer() - start
+        samples = -(-iterations // thin) * self.chains
+        variables = dict((name, n * samples * np.dtype(np.double).itemsize)
+                         for name, n in elements.items())
+        return Estimate(iterations * elapsed / sum(probed),
+                        sum(variables.values()), variables)
+
+    def _sample_chunks(self, iterations, chunks, vars, thin, monitor_type,
+                       progress_bar=None):
+        """Samples the model in chunks. For each number of iterations from
+        chunks, sets monitors, updates the model, dumps and clears monitors.
+        Yields samples from each chunk as returned by _dump_monitor_parts.
+        """
+        progress_bar = progress_bar or self.progress_bar
+        with progress_bar(self.chains * iterations,
+                          header='sampling: ') as progress:
+            for steps in chunks:
+                with self._monitors(vars, thin, monitor_type):
+                    self._update_progress(progress, steps)
+                    parts = self._dump_monitor_parts(monitor_type)
+                yield parts
+
+    @contextlib.contextmanager
+    def _monitors(self, vars, thin, monitor_type):
+        """Sets monitors for given variables and clears them on exit."""
         monitored = []
         try:
             for name in vars:
                 self.console.setMonitor(name, thin, monitor_type)
                 monitored.append(name)
-            self._update(iterations, 'sampling: ')
-            samples = self.console.dumpMonitors(monitor_type, False)
-            samples = dict_from_jags(samples)
+            yield
         finally:
             for name in monitored:
                 self.console.clearMonitor(name, monitor_type)
-        return samples
+
+    def _dump_monitor_parts(self, monitor_type):
+        """Dumps monitors as a list of pairs with 0-based index of first chain
+        and samples from consecutive chains starting from it."""
+        if self.use_threads:
+            return self.console.dumpMonitorParts(monitor_type, False)
+        else:
+            return [(0, self.console.dumpMonitors(monitor_type, False))]
+
+    def close(self):
+        """Releases resources held by the model, i.e., stops threads used to
+        update chains, and worker processes used by the 'process' backend.
+        Model can not be used afterwards.
+        """
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        if self.use_threads:
+            self.console.close()
 
     def adapt(self, iterations):
         """Run adaptation steps to maximize samplers efficiency.
@@ -427,6 +1323,150 @@ class Model:
         self._update(iterations, 'adapting: ')
         return self.console.checkAdaptation()
 
+    def checkpoint(self, path):
+        """Saves values of parameters and states of random number generators
+        of all chains, together with adaptation status and iteration number,
+        so that sampling can be resumed later with restore.
+
+        Parameters
+        ----------
+        path : str or file
+            Path of the file, or a file opened in binary mode. Checkpoint is
+            saved in numpy .npz format, see pyjags.checkpoint.
+        """
+        save_checkpoint(path, self._checkpoint_state())
+
+    @classmethod
+    def restore(cls, code, data, path, adapt=1000, **kwargs):
+        """Creates a model from code and data, and restores state of its
+        chains from a checkpoint saved with checkpoint method.
+
+        Model is compiled with the checkpointed values of parameters as
+        initial values, so that deterministic nodes are computed from them,
+        and sampling continues exactly as in the checkpointed model.
+
+        Internal state of adaptive samplers is not part of JAGS model state
+        and can not be saved. When model with adaptive samplers was
+        checkpointed after adaptation, samplers are adapted anew, starting
+        from the restored state, which is then restored again, and adaptation
+        is turned off. Sampling continues from the same values of parameters
+        and random number generator states, but it is not exact: samplers are
+        tuned differently, and deterministic nodes keep values from the end
+        of adaptation until their parents are updated in the first
+        iteration.
+
+        Parameters
+        ----------
+        code : str or bytes
+            Code of the model, same as used to create checkpointed model.
+            May be None when model is provided with file keyword argument.
+        data : dict
+            Data of the model, same as used to create checkpointed model.
+        path : str or file
+            Path of the checkpoint, or a file opened in binary mode.
+        adapt : int, optional
+            Number of adaptation steps used to tune samplers of a model that
+            was checkpointed after adaptation.
+        kwargs
+            Other arguments passed to Model constructor, except for init and
+            chains, which are restored from the checkpoint.
+
+        Returns
+        -------
+        Model
+        """
+        checkpoint = load_checkpoint(path)
+        model = cls(code=code, data=data, init=checkpoint.parameters,
+                    chains=len(checkpoint.parameters), adapt=0, **kwargs)
+        model._adapt = adapt
+        model._restore_state(checkpoint, adapt, recompile=False)
+        return model
+
+    def _checkpoint_state(self):
+        return Checkpoint(self.parameters, self.iteration,
+                          bool(self.console.isAdapting()))
+
+    def _restore_state(self, checkpoint, adapt=0, recompile=True):
+        """Restores state of chains from checkpoint in this model, see
+        Model.restore. With recompile, the model is compiled anew with
+        checkpointed parameters as initial values, otherwise it should have
+        been just initialized with them. If checkpointed model was not
+        adapting, samplers are adapted for adapt iterations, parameters are
+        set again, and adaptation is turned off."""
+        if len(checkpoint.parameters) != self.chains:
+            raise ValueError(
+                'Checkpoint has {} chains, but model has {}.'.format(
+                    len(checkpoint.parameters), self.chains))
+        if recompile:
+            # Setting parameters of an initialized model does not update
+            # deterministic nodes, initialization does.
+            self._init_compile(self._data, self._generate_data, clear=True)
+            self._init_parameters(checkpoint.parameters)
+            self.console.initialize()
+        if not checkpoint.adapting and self.console.isAdapting():
+            if adapt:
+                self.adapt(adapt)
+                for chain, parameters in enumerate(checkpoint.parameters, 1):
+                    parameters = dict(parameters)
+                    rng_name = parameters.pop('.RNG.name', None)
+                    if rng_name is not None:
+                        self.console.setRNGname(rng_name, chain)
+                    self.console.setParameters(dict_to_jags(parameters),
+                                               chain)
+            self.console.adaptOff()
+        self.iteration_offset = checkpoint.iteration - self.console.iter()
+
+    def _start_job(self, checkpoint_every, checkpoint_dir, resume, job):
+        """Starts a job checkpointed in given directory, or resumes it from
+        the latest checkpoint. Returns the directory and number of iterations
+        already done."""
+        if checkpoint_every is None or checkpoint_dir is None:
+            raise ValueError(
+                'Both checkpoint_every and checkpoint_dir must be provided.')
+        if checkpoint_every < 1:
+            raise ValueError('Checkpoint_every should be a positive integer.')
+        directory = CheckpointDirectory(checkpoint_dir)
+        checkpoint, start = directory.start(job, resume, self.iteration)
+        if checkpoint is None:
+            return directory, 0
+        self._restore_state(checkpoint, self._adapt)
+        return directory, checkpoint.iteration - start
+
+    def __getstate__(self):
+        """Returns code, data and options used to create the model, together
+        with a checkpoint of its chains, see Model.checkpoint."""
+        code = self._code
+        if self._file:
+            with open(self._file, 'rb') as f:
+                code = f.read()
+        return {
+            'code': code,
+            'data': self._data,
+            'generate_data': self._generate_data,
+            'options': self._options,
+            'checkpoint': self._checkpoint_state(),
+        }
+
+    def __setstate__(self, state):
+        """Creates the model anew from pickled code, data and options, and
+        restores state of its chains. Adaptation is not repeated. Samplers of
+        a model that was adapted are not tuned, as internal state of adaptive
+        samplers is not part of JAGS model state, but adaptation remains
+        turned off."""
+        checkpoint = state['checkpoint']
+        self.__init__(code=state['code'], data=state['data'],
+                      init=checkpoint.parameters,
+                      chains=len(checkpoint.parameters), adapt=0,
+                      generate_data=state['generate_data'],
+                      **state['options'])
+        self._restore_state(checkpoint, recompile=False)
+
+    @property
+    def iteration(self):
+        """Number of iterations done by the model, including adaptation and
+        iterations done before the model was restored from a checkpoint."""
+        return self.iteration_offset + self.console.iter()
+
     @property
     def variables(self):
         """Variable names used in the model."""
@@ -441,7 +1481,7 @@ class Model:
         parameters
         data
         """
-        return [dict_from_jags(self.console.dumpState(DUMP_ALL, chain))
+        return [self.console.dumpState(DUMP_ALL, chain)
                 for chain in range(1, self.chains + 1)]
 
     @property
@@ -449,7 +1489,7 @@ class Model:
         """Values of model parameters for each chain. Includes name of random
         number generator as '.RNG.name' and its state as '.RNG.state'.
         """
-        return [dict_from_jags(self.console.dumpState(DUMP_PARAMETERS, chain))
+        return [self.console.dumpState(DUMP_PARAMETERS, chain)
                 for chain in range(1, self.chains + 1)]
 
     @property
@@ -457,4 +1497,4 @@ class Model:
         """Model data. Includes data provided during model construction and
         data generated as part of data block.
         """
-        return dict_from_jags(self.console.dumpState(DUMP_DATA, 1))
+        return self.console.dumpState(DUMP_DATA, 1)
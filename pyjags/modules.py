@@ -146,7 +146,7 @@ def load_module(name, modules_dir=None):
     modules_dir : str, optional
         Directory where modules are located.
     """
-    if name not in loaded_modules:
+    if name not in loaded_modules and name not in builtin_modules:
         dir = modules_dir or get_modules_dir()
         ext = '.so' if os.name == 'posix' else '.dll'
         path = os.path.join(dir, name + ext)
@@ -157,6 +157,10 @@ def load_module(name, modules_dir=None):
 
 loaded_modules = {}
 
+# Modules compiled into the console extension, instead of being loaded from
+# the modules directory.
+builtin_modules = ['pyjags']
+
 
 def unload_module(name):
     """Unload a module."""
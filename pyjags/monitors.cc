@@ -0,0 +1,300 @@
+// Copyright (C) 2016 Tomasz Miasko
+//
+// This program is free software; you can redistribute it and/or modify
+// it under the terms of the GNU General Public License version 2 as
+// published by the Free Software Foundation.
+//
+// This program is distributed in the hope that it will be useful,
+// but WITHOUT ANY WARRANTY; without even the implied warranty of
+// MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+// GNU General Public License for more details.
+
+// JAGS module named "pyjags" with monitors that summarize values of nodes
+// inside JAGS update loop, using memory independent of number of iterations.
+// The module is part of the console extension, and registers itself when the
+// extension is loaded.
+
+#include <Module.h>
+#include <model/BUGSModel.h>
+#include <model/Monitor.h>
+#include <model/MonitorFactory.h>
+#include <model/NodeArray.h>
+#include <model/NodeArraySubset.h>
+#include <model/SymTab.h>
+#include <sarray/Range.h>
+#include <util/nainf.h>
+
+#include <algorithm>
+#include <cmath>
+#include <string>
+#include <vector>
+
+namespace {
+
+using namespace jags;
+
+// Returns true for values that should be included in summaries.
+inline bool is_observed(double value) {
+  return value != JAGS_NA && std::isfinite(value);
+}
+
+// Returns number of elements in the subset.
+std::size_t length(NodeArraySubset const &subset) {
+  std::size_t length = 1;
+  for (unsigned int d : subset.dim()) {
+    length *= d;
+  }
+  return length;
+}
+
+// Monitor type "moments". For each node element and chain, computes mean and
+// standard deviation of values from all iterations, using Welford's
+// algorithm. Dumped values have dimensions (dim_1, ..., dim_n, 2, chains),
+// with mean and standard deviation along the second to last dimension.
+class MomentsMonitor : public Monitor {
+  NodeArraySubset subset_;
+  std::vector<std::vector<double>> count_;
+  std::vector<std::vector<double>> mean_;
+  std::vector<std::vector<double>> m2_;
+  mutable std::vector<std::vector<double>> values_;
+
+public:
+  explicit MomentsMonitor(NodeArraySubset const &subset)
+      : Monitor("moments", subset.nodes()), subset_(subset),
+        count_(subset.nchain(), std::vector<double>(length(subset))),
+        mean_(count_), m2_(count_), values_(subset.nchain()) {}
+
+  void update() {
+    for (unsigned int ch = 0; ch < count_.size(); ++ch) {
+      const std::vector<double> v = subset_.value(ch);
+      for (std::size_t i = 0; i < v.size(); ++i) {
+        if (!is_observed(v[i])) {
+          continue;
+        }
+        const double n = ++count_[ch][i];
+        const double delta = v[i] - mean_[ch][i];
+        mean_[ch][i] += delta / n;
+        m2_[ch][i] += delta * (v[i] - mean_[ch][i]);
+      }
+    }
+  }
+
+  std::vector<double> const &value(unsigned int chain) const {
+    const std::vector<double> &count = count_[chain];
+    const std::size_t length = count.size();
+    std::vector<double> &values = values_[chain];
+    values.assign(2 * length, JAGS_NA);
+    for (std::size_t i = 0; i < length; ++i) {
+      if (count[i] > 0) {
+        values[i] = mean_[chain][i];
+      }
+      if (count[i] > 1) {
+        values[length + i] = std::sqrt(m2_[chain][i] / (count[i] - 1));
+      }
+    }
+    return values;
+  }
+
+  std::vector<unsigned int> dim() const {
+    std::vector<unsigned int> dim = subset_.dim();
+    dim.push_back(2);
+    return dim;
+  }
+
+  bool poolChains() const {
+    return false;
+  }
+
+  bool poolIterations() const {
+    return true;
+  }
+};
+
+// Histogram with a fixed number of equal width bins. The initial range is
+// determined from the first values added, and later doubled as necessary to
+// cover all values.
+class Histogram {
+  std::vector<double> buffer_;
+  std::vector<double> counts_;
+  double lower_;
+  double width_;
+
+  void grow_up() {
+    const unsigned int half = bins / 2;
+    for (unsigned int i = 0; i < half; ++i) {
+      counts_[i] = counts_[2 * i] + counts_[2 * i + 1];
+    }
+    std::fill(counts_.begin() + half, counts_.end(), 0);
+    width_ *= 2;
+  }
+
+  void grow_down() {
+    const unsigned int half = bins / 2;
+    for (unsigned int i = half; i-- > 0;) {
+      counts_[half + i] = counts_[2 * i] + counts_[2 * i + 1];
+    }
+    std::fill(counts_.begin(), counts_.begin() + half, 0);
+    lower_ -= bins * width_;
+    width_ *= 2;
+  }
+
+  void insert(double value) {
+    while (value < lower_) {
+      grow_down();
+    }
+    while (value >= lower_ + bins * width_) {
+      grow_up();
+    }
+    const unsigned int bin =
+        static_cast<unsigned int>((value - lower_) / width_);
+    counts_[std::min(bin, bins - 1)] += 1;
+  }
+
+public:
+  static const unsigned int bins = 100;
+
+  Histogram() : lower_(0), width_(0) {}
+
+  void add(double value) {
+    if (!is_observed(value)) {
+      return;
+    }
+    if (counts_.empty()) {
+      buffer_.push_back(value);
+      if (buffer_.size() == bins) {
+        flush();
+      }
+    } else {
+      insert(value);
+    }
+  }
+
+  // Determines the range of histogram from buffered values.
+  void flush() {
+    if (!counts_.empty() || buffer_.empty()) {
+      return;
+    }
+    auto range = std::minmax_element(buffer_.begin(), buffer_.end());
+    width_ = (*range.second - *range.first) / (bins - 1);
+    if (!(width_ > 0)) {
+      width_ = 1;
+    }
+    lower_ = *range.first - width_ / 2;
+    counts_.assign(bins, 0);
+    for (double value : buffer_) {
+      insert(value);
+    }
+    std::vector<double>().swap(buffer_);
+  }
+
+  // Writes lower bound, bin width and counts of histogram to every stride-th
+  // element of out. Writes JAGS_NA when histogram is empty.
+  void write(double *out, std::size_t stride) const {
+    Histogram h(*this);
+    h.flush();
+    const bool empty = h.counts_.empty();
+    out[0] = empty ? JAGS_NA : h.lower_;
+    out[stride] = empty ? JAGS_NA : h.width_;
+    for (unsigned int i = 0; i < bins; ++i) {
+      out[(i + 2) * stride] = empty ? JAGS_NA : h.counts_[i];
+    }
+  }
+};
+
+const unsigned int Histogram::bins;
+
+// Monitor type "histogram". For each node element and chain, computes a
+// histogram of values from all iterations. Dumped values have dimensions
+// (dim_1, ..., dim_n, 102, chains). Along the second to last dimension are
+// lower bound of the first bin, bin width, and counts in 100 bins.
+class HistogramMonitor : public Monitor {
+  NodeArraySubset subset_;
+  std::vector<std::vector<Histogram>> histograms_;
+  mutable std::vector<std::vector<double>> values_;
+
+public:
+  explicit HistogramMonitor(NodeArraySubset const &subset)
+      : Monitor("histogram", subset.nodes()), subset_(subset),
+        histograms_(subset.nchain(), std::vector<Histogram>(length(subset))),
+        values_(subset.nchain()) {}
+
+  void update() {
+    for (unsigned int ch = 0; ch < histograms_.size(); ++ch) {
+      const std::vector<double> v = subset_.value(ch);
+      for (std::size_t i = 0; i < v.size(); ++i) {
+        histograms_[ch][i].add(v[i]);
+      }
+    }
+  }
+
+  std::vector<double> const &value(unsigned int chain) const {
+    const std::vector<Histogram> &histograms = histograms_[chain];
+    const std::size_t length = histograms.size();
+    std::vector<double> &values = values_[chain];
+    values.resize((Histogram::bins + 2) * length);
+    for (std::size_t i = 0; i < length; ++i) {
+      histograms[i].write(&values[i], length);
+    }
+    return values;
+  }
+
+  std::vector<unsigned int> dim() const {
+    std::vector<unsigned int> dim = subset_.dim();
+    dim.push_back(Histogram::bins + 2);
+    return dim;
+  }
+
+  bool poolChains() const {
+    return false;
+  }
+
+  bool poolIterations() const {
+    return true;
+  }
+};
+
+class SummaryMonitorFactory : public MonitorFactory {
+public:
+  Monitor *getMonitor(std::string const &name, Range const &range,
+                      BUGSModel *model, std::string const &type,
+                      std::string &msg) {
+    if (type != "moments" && type != "histogram") {
+      return nullptr;
+    }
+    NodeArray *array = model->symtab().getVariable(name);
+    if (!array) {
+      msg = std::string("variable ") + name + " not found";
+      return nullptr;
+    }
+    NodeArraySubset subset(array, range);
+    Monitor *monitor;
+    if (type == "moments") {
+      monitor = new MomentsMonitor(subset);
+    } else {
+      monitor = new HistogramMonitor(subset);
+    }
+    monitor->setName(name);
+    return monitor;
+  }
+
+  std::string name() const {
+    return "pyjags::Summary";
+  }
+};
+
+class PyjagsModule : public Module {
+public:
+  PyjagsModule() : Module("pyjags") {
+    insert(new SummaryMonitorFactory);
+  }
+
+  ~PyjagsModule() {
+    for (MonitorFactory *factory : monitorFactories()) {
+      delete factory;
+    }
+  }
+};
+
+PyjagsModule pyjags_module;
+
+} // namespace
@@ -0,0 +1,114 @@
+# Copyright (C) 2016 Tomasz Miasko
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+__all__ = ['ProcessConsole']
+
+import functools
+import multiprocessing
+import signal
+
+from . import modules as jags_modules
+from .console import Console, JagsError
+from .modules import list_modules, load_module, set_modules_dir
+
+
+def spawn_context():
+    """Multiprocessing context starting worker processes with spawn method.
+
+    Forking a process with running threads, e.g., threads of MultiConsole,
+    may deadlock the child on locks held by other threads. Spawned workers
+    import the main module anew, so scripts should guard their main code
+    with ``if __name__ == '__main__'``. Falls back to the default method on
+    Python 2.
+    """
+    if hasattr(multiprocessing, 'get_context'):
+        return multiprocessing.get_context('spawn')
+    return multiprocessing
+
+
+def console_worker(connection, modules, modules_dir):
+    """Main loop of a worker process. Executes console method calls received
+    through the connection and sends back their results.
+    """
+    # Interrupts are handled by the parent process.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if modules_dir is not None:
+        set_modules_dir(modules_dir)
+    for name in modules:
+        load_module(name)
+    console = Console()
+    while True:
+        try:
+            name, args = connection.recv()
+        except EOFError:
+            # The other end of connection has been closed.
+            break
+        if name is None:
+            break
+        try:
+            result = ('ok', getattr(console, name)(*args))
+        except JagsError as err:
+            # JagsError is not picklable, send only the message.
+            result = ('jags_error', str(err))
+        except Exception as err:
+            result = ('error', err)
+        connection.send(result)
+    connection.close()
+
+
+class ProcessConsole:
+    """Console running in a separate worker process.
+
+    Provides the same methods as the Console, but each call is forwarded to
+    a console owned by the worker process. Worker process inherits modules
+    loaded at the time of console creation. Worker processes are started
+    with spawn method, see spawn_context.
+    """
+
+    def __init__(self):
+        context = spawn_context()
+        self.connection, child = context.Pipe()
+        self.process = context.Process(
+            target=console_worker,
+            args=(child, list_modules(), jags_modules.modules_dir))
+        self.process.daemon = True
+        self.process.start()
+        child.close()
+
+    def call(self, name, *args):
+        """Calls console method in the worker process and returns its result."""
+        try:
+            self.connection.send((name, args))
+            status, result = self.connection.recv()
+        except (EOFError, IOError):
+            raise RuntimeError(
+                'Console worker process {} exited unexpectedly.'.format(
+                    self.process.pid))
+        if status == 'jags_error':
+            raise JagsError(result)
+        elif status == 'error':
+            raise result
+        return result
+
+    def close(self):
+        """Stops the worker process."""
+        if self.process.is_alive():
+            try:
+                self.connection.send((None, ()))
+            except IOError:
+                pass
+        self.connection.close()
+        self.process.join()
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return functools.partial(self.call, name)
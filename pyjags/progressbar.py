@@ -9,7 +9,7 @@
 # MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
 # GNU General Public License for more details.
 
-__all__ = ['const_time_partition', 'progressbar']
+__all__ = ['const_time_partition', 'deadline_partition', 'progressbar']
 
 import math
 import sys
@@ -78,6 +78,54 @@ def const_time_partition(iterations, period, timer=default_timer):
             next = left
 
 
+def deadline_partition(iterations, seconds, period, timer=default_timer,
+                       margin=0.05):
+    """
+    Divides at most iterations into sub-iterations that complete before a
+    deadline. Like const_time_partition, sub-iterations take roughly period
+    seconds, and time necessary to complete a single iteration is estimated
+    from already completed iterations. Iterations stop when the next one is
+    estimated to finish after the deadline.
+
+    Since the estimate may be off when the cost of iterations changes, each
+    sub-iteration has at most as many steps as all previous ones together,
+    and a fraction of the time budget is kept in reserve, e.g., for
+    processing samples after the last sub-iteration.
+
+    Parameters
+    ----------
+    iterations : int
+        A non-negative integer specifying maximum number of steps to execute.
+    seconds : float
+        A positive float number specifying time budget, measured from the
+        first yield.
+    period : float
+        A positive float number describing desired period between yields from
+        generator.
+    timer : callable, optional
+        Monotonic clock, see const_time_partition.
+    margin : float, optional
+        Fraction of the time budget kept in reserve.
+    """
+    deadline = seconds * (1 - margin)
+    start = timer()
+    left = iterations
+    next = 1
+    while left > 0 and next > 0:
+        yield next
+        elapsed = timer() - start
+        left -= next
+        done = iterations - left
+        if elapsed > 0:
+            per_iteration = elapsed / done
+            next = max(1, int(period / per_iteration))
+            next = min(next, done,
+                       int((deadline - elapsed) / per_iteration))
+        else:
+            next *= 2
+        next = min(next, left)
+
+
 class EmptyProgressBar:
 
     def __init__(self, *args, **kwargs):
@@ -0,0 +1,114 @@
+# Copyright (C) 2016 Tomasz Miasko
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+__all__ = ['TraceStore', 'write_chains']
+
+import os
+
+import numpy as np
+
+
+def write_chains(out, parts, iteration=0, chain=0):
+    """Writes samples from consecutive groups of chains into preallocated
+    arrays, starting at given iteration and chain. Returns number of samples
+    written per chain.
+    """
+    samples = 0
+    for first, part in parts:
+        for k, v in part.items():
+            samples = v.shape[-2]
+            start = chain + first
+            out[k][..., iteration:iteration + samples,
+                   start:start + v.shape[-1]] = v
+    return samples
+
+
+class TraceStore:
+    """Traces of monitored variables kept in a directory as memory-mapped
+    .npy files, one file per variable.
+
+    Each file holds an array with shape (dim_1, ..., dim_n, iterations,
+    chains) in fortran order, so that samples of a single chain from
+    consecutive iterations are contiguous on disk. Files are created with
+    their final size when the first samples of a variable are written, and
+    can be opened by other processes, e.g., with ``numpy.load(path,
+    mmap_mode='r')``, while sampling is still in progress. Samples which have
+    not been written yet are zero.
+
+    Attributes
+    ----------
+    arrays : dict
+        Memory-mapped arrays, keys are variable names.
+    """
+
+    def __init__(self, directory, iterations, chains, resume=False):
+        """
+        Parameters
+        ----------
+        directory : str
+            Directory where files will be stored. Created if necessary.
+        iterations : int
+            Number of samples per chain.
+        chains : int
+            Number of chains.
+        resume : bool, optional
+            If true, existing files are opened and written to, instead of
+            being created anew.
+        """
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.directory = directory
+        self.iterations = iterations
+        self.chains = chains
+        self.resume = resume
+        self.arrays = {}
+
+    def path(self, name):
+        """Path of the file for given variable."""
+        return os.path.join(self.directory, name + '.npy')
+
+    def write(self, parts, iteration):
+        """Writes samples from consecutive groups of chains starting at given
+        iteration. Returns number of samples written per chain.
+        """
+        for _, part in parts:
+            for name, v in part.items():
+                if name not in self.arrays:
+                    self.arrays[name] = self.open(name, v.shape[:-2])
+        return write_chains(self.arrays, parts, iteration)
+
+    def open(self, name, shape):
+        """Creates a file for variable with given shape, or opens an existing
+        one when resuming."""
+        shape = tuple(shape) + (self.iterations, self.chains)
+        if self.resume and os.path.exists(self.path(name)):
+            array = np.lib.format.open_memmap(self.path(name), mode='r+')
+            if array.shape != shape:
+                raise ValueError(
+                    'Shape of {} is {}, expected {}.'.format(
+                        self.path(name), array.shape, shape))
+            return array
+        return np.lib.format.open_memmap(
+            self.path(name), mode='w+', dtype=np.double,
+            shape=shape, fortran_order=True)
+
+    def load(self, names):
+        """Opens existing files of given variables, which have not been
+        written to yet."""
+        for name in names:
+            if name not in self.arrays and os.path.exists(self.path(name)):
+                self.arrays[name] = np.lib.format.open_memmap(
+                    self.path(name), mode='r+')
+
+    def flush(self):
+        """Writes changes to disk."""
+        for array in self.arrays.values():
+            array.flush()
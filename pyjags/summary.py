@@ -0,0 +1,236 @@
+# Copyright (C) 2016 Tomasz Miasko
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+__all__ = ['Moments', 'QuantileSketch', 'Summary']
+
+import math
+
+import numpy as np
+
+
+class Moments:
+    """Mean and variance of multiple variables, computed in a single pass
+    over their values.
+
+    Values can be added in batches and moments from separate instances can
+    be merged, using the parallel variant of Welford's algorithm by Chan et
+    al.
+
+    Attributes
+    ----------
+    count : int
+        Number of values of each variable.
+    mean : numpy.ndarray
+        Mean of each variable.
+    """
+
+    def __init__(self, size):
+        """
+        Parameters
+        ----------
+        size : int
+            Number of variables.
+        """
+        self.count = 0
+        self.mean = np.zeros(size)
+        self.m2 = np.zeros(size)
+
+    def update(self, values):
+        """Adds values with shape (size, n), i.e., n values of each variable."""
+        values = np.asarray(values, dtype=np.double)
+        values = values.reshape(len(self.mean), -1)
+        if not values.shape[1]:
+            return
+        mean = values.mean(axis=1)
+        m2 = np.square(values - mean[:, np.newaxis]).sum(axis=1)
+        self.combine(values.shape[1], mean, m2)
+
+    def merge(self, other):
+        """Adds values summarized by other Moments instance."""
+        self.combine(other.count, other.mean, other.m2)
+
+    def combine(self, count, mean, m2):
+        if not count:
+            return
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean = self.mean + delta * (count / float(total))
+        self.m2 = self.m2 + m2 + np.square(delta) * (
+            self.count * count / float(total))
+        self.count = total
+
+    @property
+    def variance(self):
+        """Sample variance of each variable."""
+        if self.count < 2:
+            return np.full_like(self.m2, np.nan)
+        return self.m2 / (self.count - 1)
+
+    @property
+    def sd(self):
+        """Sample standard deviation of each variable."""
+        return np.sqrt(self.variance)
+
+
+class QuantileSketch:
+    """Approximate quantiles of multiple variables, computed with bounded
+    memory in a single pass over their values.
+
+    Uses compactors of KLL sketch (Karnin, Lang and Liberty, 2016). Each
+    variable receives the same number of values, so all variables share the
+    layout of compactors, and operations are vectorized across variables.
+    Memory used is proportional to size * k, and independent of number of
+    values. Sketches of the same variables can be merged.
+    """
+
+    def __init__(self, size, k=200, seed=None):
+        """
+        Parameters
+        ----------
+        size : int
+            Number of variables.
+        k : int, 200 by default
+            Capacity of the top compactor. Larger values give more accurate
+            quantiles, with rank error roughly proportional to 1 / k.
+        seed : int, optional
+            Seed used to randomize compactions.
+        """
+        self.size = size
+        self.k = k
+        self.count = 0
+        self.levels = [np.empty((size, 0))]
+        self.random = np.random.RandomState(seed)
+
+    def capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(2, int(math.ceil(self.k * (2.0 / 3.0) ** depth)))
+
+    def update(self, values):
+        """Adds values with shape (size, n), i.e., n values of each variable."""
+        values = np.asarray(values, dtype=np.double)
+        values = values.reshape(self.size, -1)
+        self.levels[0] = np.concatenate((self.levels[0], values), axis=1)
+        self.count += values.shape[1]
+        self.compress()
+
+    def merge(self, other):
+        """Adds values summarized by other QuantileSketch instance."""
+        for level, values in enumerate(other.levels):
+            if level == len(self.levels):
+                self.levels.append(np.empty((self.size, 0)))
+            self.levels[level] = np.concatenate(
+                (self.levels[level], values), axis=1)
+        self.count += other.count
+        self.compress()
+
+    def compress(self):
+        # Compaction of a level sorts its values, and promotes every other one
+        # to the next level, where values have twice the weight.
+        level = 0
+        while level < len(self.levels):
+            values = self.levels[level]
+            if values.shape[1] >= self.capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty((self.size, 0)))
+                values = np.sort(values, axis=1)
+                n = values.shape[1] // 2 * 2
+                offset = self.random.randint(2)
+                self.levels[level + 1] = np.concatenate(
+                    (self.levels[level + 1], values[:, offset:n:2]), axis=1)
+                self.levels[level] = values[:, n:]
+            level += 1
+
+    def quantile(self, q):
+        """Approximate quantiles of each variable.
+
+        Parameters
+        ----------
+        q : float or sequence of floats
+            Probabilities in [0, 1].
+
+        Returns
+        -------
+        numpy.ndarray
+            Array with shape (size, len(q)).
+        """
+        q = np.atleast_1d(q)
+        values = np.concatenate(self.levels, axis=1)
+        weights = np.concatenate([np.repeat(2.0 ** level, v.shape[1])
+                                  for level, v in enumerate(self.levels)])
+        rows = np.arange(self.size)[:, np.newaxis]
+        order = np.argsort(values, axis=1)
+        values = values[rows, order]
+        cumulative = np.cumsum(weights[order], axis=1)
+        result = np.empty((self.size, len(q)))
+        if not values.shape[1]:
+            result.fill(np.nan)
+            return result
+        for i, p in enumerate(q):
+            index = np.sum(cumulative < p * cumulative[:, -1:], axis=1)
+            index = np.minimum(index, values.shape[1] - 1)
+            result[:, i] = values[rows[:, 0], index]
+        return result
+
+
+class Summary:
+    """Streaming summary of samples of a single variable: mean, standard
+    deviation and approximate quantiles of each element of the variable.
+    """
+
+    def __init__(self, shape, k=200):
+        """
+        Parameters
+        ----------
+        shape : tuple of ints
+            Shape of variable.
+        k : int, 200 by default
+            Size of quantile sketch, see QuantileSketch.
+        """
+        self.shape = tuple(shape)
+        size = int(np.prod(self.shape))
+        self.moments = Moments(size)
+        self.sketch = QuantileSketch(size, k)
+        self.missing = np.zeros(size, dtype=bool)
+
+    def update(self, samples):
+        """Adds samples with shape (dim_1, ..., dim_n, iterations, chains).
+        Elements with masked samples are reported as missing."""
+        values = samples.reshape(len(self.missing), -1)
+        if np.ma.isMaskedArray(values):
+            self.missing |= np.ma.getmaskarray(values).any(axis=1)
+            values = np.ma.filled(values, 0.0)
+        self.moments.update(values)
+        self.sketch.update(values)
+
+    def merge(self, other):
+        """Adds samples summarized by other Summary instance."""
+        self.moments.merge(other.moments)
+        self.sketch.merge(other.sketch)
+        self.missing |= other.missing
+
+    def result(self, quantiles):
+        """Returns a dictionary with 'mean' and 'sd' arrays with shape of the
+        variable, and 'quantiles' array with additional last dimension
+        corresponding to given quantiles."""
+        result = {
+            'mean': self.moments.mean.reshape(self.shape),
+            'sd': self.moments.sd.reshape(self.shape),
+            'quantiles': self.sketch.quantile(quantiles).reshape(
+                self.shape + (len(quantiles),)),
+        }
+        if self.missing.any():
+            missing = self.missing.reshape(self.shape)
+            for k, v in result.items():
+                mask = missing.reshape(
+                    missing.shape + (1,) * (v.ndim - missing.ndim))
+                result[k] = np.ma.masked_array(
+                    v, mask=np.broadcast_to(mask, v.shape))
+        return result
@@ -67,7 +67,7 @@ def add_pybind11(ext):
 if __name__ == '__main__':
     ext = Extension('pyjags.console',
                     language='c++',
-                    sources=['pyjags/console.cc'])
+                    sources=['pyjags/console.cc', 'pyjags/monitors.cc'])
     add_jags(ext)
     add_numpy(ext)
     add_pybind11(ext)
@@ -0,0 +1,70 @@
+# Copyright (C) 2016 Tomasz Miasko
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+import sys
+import unittest
+
+import pyjags
+
+
+@unittest.skipIf(sys.version_info < (3, 5), 'requires Python 3.5')
+class TestAsync(unittest.TestCase):
+
+    def setUp(self):
+        import asyncio
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+
+    def model(self, **kwargs):
+        return pyjags.Model('model { x ~ dnorm(0, 1) }', chains=2,
+                            progress_bar=False, **kwargs)
+
+    def progress(self, run):
+        """Collects progress reported by run."""
+        progress = []
+        iterator = run.__aiter__()
+        while True:
+            try:
+                progress.append(
+                    self.loop.run_until_complete(iterator.__anext__()))
+            except StopAsyncIteration:
+                return progress
+
+    def test_update_async(self):
+        m = self.model()
+        iteration = m.iteration
+        self.assertIsNone(self.loop.run_until_complete(m.update_async(100)))
+        self.assertEqual(iteration + 100, m.iteration)
+
+    def test_sample_async(self):
+        m = self.model(threads=2)
+        run = m.sample_async(100, thin=2)
+        progress = self.progress(run)
+        samples = self.loop.run_until_complete(run)
+
+        self.assertEqual((100, 100), progress[-1])
+        self.assertEqual((1, 50, 2), samples['x'].shape)
+        # Iterating over finished run stops immediately.
+        self.assertEqual([], self.progress(run))
+
+    def test_cancel(self):
+        import asyncio
+        m = self.model()
+        task = asyncio.ensure_future(m.sample_async(10 ** 7), loop=self.loop)
+        self.loop.call_later(0.5, task.cancel)
+        with self.assertRaises(asyncio.CancelledError):
+            self.loop.run_until_complete(task)
+        # Monitors are cleared and model can be used again.
+        self.assertEqual((1, 10, 2), m.sample(10)['x'].shape)
+
+
+if __name__ == '__main__':
+    unittest.main()
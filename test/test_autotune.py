@@ -0,0 +1,77 @@
+# Copyright (C) 2016 Tomasz Miasko
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+import unittest
+
+from pyjags.autotune import candidate_layouts, tune_layout
+
+
+class FakeTimer:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeModel:
+    """Model where an iteration takes given number of seconds."""
+
+    def __init__(self, timer, seconds_per_iteration):
+        self.timer = timer
+        self.seconds_per_iteration = seconds_per_iteration
+        self.closed = False
+
+    def update(self, iterations):
+        self.timer.now += iterations * self.seconds_per_iteration
+
+    def close(self):
+        self.closed = True
+
+
+class TestAutotune(unittest.TestCase):
+
+    def test_candidate_layouts(self):
+        self.assertEqual([(4, 1), (2, 2), (1, 4)], candidate_layouts(4, 8))
+        self.assertEqual([(3, 2), (2, 3), (1, 6)], candidate_layouts(6, 3))
+        self.assertEqual([(1, 1)], candidate_layouts(1, 8))
+
+    def test_selects_fastest_layout(self):
+        timer = FakeTimer()
+        speed = {(4, 1): 0.002, (2, 2): 0.001, (1, 4): 0.004}
+        models = []
+
+        def create(threads, chains_per_thread):
+            models.append(FakeModel(timer, speed[threads, chains_per_thread]))
+            return models[-1]
+
+        best, layouts = tune_layout(create, 4, seconds=3.0, cpus=4,
+                                    timer=timer)
+        self.assertEqual((2, 2), best[:2])
+        self.assertAlmostEqual(1000.0, best.iterations_per_second)
+        self.assertEqual(3, len(layouts))
+        self.assertTrue(all(model.closed for model in models))
+        self.assertLess(timer.now, 3.0 * 2)
+
+    def test_single_layout_is_not_measured(self):
+        def create(threads, chains_per_thread):
+            self.fail('Pilot model created.')
+
+        best, layouts = tune_layout(create, 1, cpus=8)
+        self.assertEqual((1, 1), best[:2])
+        self.assertEqual([best], layouts)
+        best, layouts = tune_layout(create, 4, cpus=1)
+        self.assertEqual((1, 4), best[:2])
+
+
+if __name__ == '__main__':
+    unittest.main()
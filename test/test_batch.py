@@ -0,0 +1,68 @@
+# Copyright (C) 2016 Tomasz Miasko
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+import sys
+import unittest
+
+import numpy as np
+
+import pyjags
+
+CODE = '''
+model {
+    mu ~ dnorm(0, 0.0001)
+    for (i in 1:length(x)) {
+        x[i] ~ dnorm(mu, 100)
+    }
+}
+'''
+
+
+@unittest.skipIf(sys.version_info[0] < 3, 'requires concurrent.futures')
+class TestFitMany(unittest.TestCase):
+
+    def test_fit_many(self):
+        datasets = ({'x': [i] * (i + 1)} for i in range(10))
+        results = dict(pyjags.fit_many(CODE, datasets, chains=2,
+                                       iterations=50, workers=2, adapt=10,
+                                       vars=['mu']))
+
+        self.assertEqual(set(range(10)), set(results))
+        for i, samples in results.items():
+            self.assertEqual((1, 50, 2), samples['mu'].shape)
+            np.testing.assert_allclose(i, samples['mu'], atol=0.5)
+
+    def test_ordered(self):
+        datasets = [{'x': [i]} for i in range(6)]
+        results = pyjags.fit_many(CODE, datasets, chains=1, iterations=10,
+                                  workers=3, ordered=True)
+        self.assertEqual(list(range(6)), [i for i, _ in results])
+
+    def test_invalid_data(self):
+        with self.assertRaises(ValueError):
+            list(pyjags.fit_many(CODE, [{'x': [1]}, {'y': 1}], workers=1))
+
+    def test_controlled_options(self):
+        for kwargs in [{'progress_bar': True}, {'threads': 4},
+                       {'file': 'model.jags'}]:
+            with self.assertRaises(TypeError):
+                list(pyjags.fit_many(CODE, [{'x': [1]}], workers=1,
+                                     **kwargs))
+
+    def test_bytes_code_with_encoding(self):
+        results = list(pyjags.fit_many(CODE.encode('utf-8'), [{'x': [1]}],
+                                       chains=1, iterations=10, workers=1,
+                                       encoding='utf-8'))
+        self.assertEqual(1, len(results))
+
+
+if __name__ == '__main__':
+    unittest.main()
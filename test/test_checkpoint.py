@@ -0,0 +1,91 @@
+# Copyright (C) 2016 Tomasz Miasko
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+import io
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from pyjags.checkpoint import (Checkpoint, CheckpointDirectory,
+                               load_checkpoint, save_checkpoint)
+
+
+class TestCheckpoint(unittest.TestCase):
+
+    def test_save_and_load(self):
+        parameters = [
+            {'x': np.array([1.0, 2.0]),
+             '.RNG.name': 'base::Mersenne-Twister',
+             '.RNG.state': np.arange(625, dtype=np.double)},
+            {'x': np.array([3.0, 4.0]),
+             '.RNG.name': 'base::Wichmann-Hill',
+             '.RNG.state': np.array([1.0, 2.0, 3.0])},
+        ]
+        f = io.BytesIO()
+        save_checkpoint(f, Checkpoint(parameters, 1500, False))
+        f.seek(0)
+        checkpoint = load_checkpoint(f)
+
+        self.assertEqual(1500, checkpoint.iteration)
+        self.assertFalse(checkpoint.adapting)
+        self.assertEqual(2, len(checkpoint.parameters))
+        for expected, actual in zip(parameters, checkpoint.parameters):
+            self.assertEqual(set(expected), set(actual))
+            self.assertEqual(expected['.RNG.name'], actual['.RNG.name'])
+            np.testing.assert_equal(expected['x'], actual['x'])
+            np.testing.assert_equal(expected['.RNG.state'],
+                                    actual['.RNG.state'])
+
+    def test_missing_values_are_saved_as_data(self):
+        x = np.ma.masked_array([1.0, -1.0], mask=[False, True])
+        f = io.BytesIO()
+        save_checkpoint(f, Checkpoint([{'x': x}], 0, True))
+        f.seek(0)
+        checkpoint = load_checkpoint(f)
+
+        self.assertTrue(checkpoint.adapting)
+        np.testing.assert_equal([1.0, -1.0], checkpoint.parameters[0]['x'])
+
+
+class TestCheckpointDirectory(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_resume_job(self):
+        job = {'iterations': np.array(100), 'vars': np.array(['a', 'b'])}
+        d = CheckpointDirectory(self.directory)
+        self.assertEqual((None, 10), d.start(job, False, 10))
+        d.save(Checkpoint([{'x': np.array([1.0])}], 30, False))
+
+        checkpoint, start = d.start(job, True, 0)
+        self.assertEqual(10, start)
+        self.assertEqual(30, checkpoint.iteration)
+
+        with self.assertRaises(ValueError):
+            d.start({'iterations': np.array(200),
+                     'vars': np.array(['a', 'b'])}, True, 0)
+
+    def test_start_without_resume_removes_checkpoint(self):
+        job = {'iterations': np.array(100)}
+        d = CheckpointDirectory(self.directory)
+        d.start(job, False, 0)
+        d.save(Checkpoint([{}], 30, False))
+        self.assertEqual((None, 5), d.start(job, False, 5))
+        self.assertIsNone(d.load())
+        self.assertEqual((None, 0), d.start(job, True, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+# Copyright (C) 2016 Tomasz Miasko
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+import threading
+import time
+import unittest
+
+import pyjags
+from pyjags.console import Console
+
+
+class TestConsole(unittest.TestCase):
+
+    def console(self):
+        pyjags.load_module('basemod')
+        pyjags.load_module('bugs')
+        console = Console()
+        console.checkModelFromString(b'model { x ~ dnorm(0, 1) }')
+        console.compile({}, 1, True)
+        console.initialize()
+        return console
+
+    def test_update_returns_iterations_done(self):
+        console = self.console()
+        self.assertEqual(100, console.update(100))
+        self.assertEqual(100, console.iter())
+        self.assertEqual(0, console.progress())
+
+    def test_interrupt_update(self):
+        console = self.console()
+        result = []
+        thread = threading.Thread(
+            target=lambda: result.append(console.update(10 ** 9)))
+        thread.start()
+        deadline = time.time() + 10
+        while console.progress() == 0 and time.time() < deadline:
+            time.sleep(0.01)
+        console.interrupt()
+        thread.join()
+
+        self.assertGreater(result[0], 0)
+        self.assertLess(result[0], 10 ** 9)
+        self.assertEqual(result[0], console.iter())
+        # Flag is cleared after stopping an update.
+        self.assertEqual(10, console.update(10))
+
+    def test_interrupt_next_update(self):
+        console = self.console()
+        console.interrupt()
+        self.assertEqual(0, console.update(10))
+        self.assertEqual(10, console.update(10))
+
+        console.interrupt()
+        console.interrupt(False)
+        self.assertEqual(10, console.update(10))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+# Copyright (C) 2016 Tomasz Miasko
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+import unittest
+
+import numpy as np
+
+from pyjags import diagnostics
+
+
+class TestDiagnostics(unittest.TestCase):
+
+    def setUp(self):
+        self.random = np.random.RandomState(0)
+
+    def test_independent_draws(self):
+        x = self.random.normal(size=(2, 3, 1000, 4))
+        d = diagnostics.diagnose(x)
+
+        for name in diagnostics.DIAGNOSTICS:
+            self.assertEqual((2, 3), d[name].shape)
+        np.testing.assert_allclose(1, d['rhat'], atol=0.01)
+        self.assertTrue(np.all(d['ess_bulk'] > 3000))
+        self.assertTrue(np.all(d['ess_tail'] > 3000))
+        np.testing.assert_allclose(1 / np.sqrt(4000), d['mcse_mean'],
+                                   rtol=0.2)
+
+    def test_diagnose_matches_single_diagnostics(self):
+        x = self.random.normal(size=(3, 101, 4))
+        d = diagnostics.diagnose(x)
+        np.testing.assert_equal(diagnostics.rhat(x), d['rhat'])
+        np.testing.assert_equal(diagnostics.ess_bulk(x), d['ess_bulk'])
+        np.testing.assert_equal(diagnostics.ess_tail(x), d['ess_tail'])
+        np.testing.assert_equal(diagnostics.mcse_mean(x), d['mcse_mean'])
+
+    def test_autocorrelated_draws(self):
+        phi = 0.9
+        e = self.random.normal(size=(2, 4000, 4))
+        x = np.zeros_like(e)
+        for t in range(1, x.shape[1]):
+            x[:, t] = phi * x[:, t - 1] + e[:, t]
+        expected = x.shape[1] * x.shape[2] * (1 - phi) / (1 + phi)
+        np.testing.assert_allclose(expected, diagnostics.ess_mean(x),
+                                   rtol=0.25)
+
+    def test_chains_with_different_locations(self):
+        x = self.random.normal(size=(5, 500, 4))
+        x[..., 0] += 3
+        self.assertTrue(np.all(diagnostics.rhat(x) > 1.1))
+
+    def test_dictionary_of_samples(self):
+        samples = {
+            'x': self.random.normal(size=(3, 100, 2)),
+            'y': self.random.normal(size=(1, 100, 2)),
+        }
+        r = diagnostics.rhat(samples)
+        self.assertEqual({'x', 'y'}, set(r.keys()))
+        self.assertEqual((3,), r['x'].shape)
+
+    def test_threads_give_the_same_results(self):
+        x = self.random.normal(size=(300, 1000, 4))
+        np.testing.assert_equal(diagnostics.ess_bulk(x, threads=1),
+                                diagnostics.ess_bulk(x, threads=4))
+
+    def test_variables_are_processed_together(self):
+        samples = dict(('x{}'.format(i), self.random.normal(size=(2, 50, 4)))
+                       for i in range(20))
+        samples['y'] = self.random.normal(size=(50, 4))
+        calls = []
+
+        def block(x):
+            calls.append(len(x))
+            return diagnostics.rhat_block(x)
+
+        r = diagnostics.apply(block, samples, threads=1)
+        self.assertEqual([41], calls)
+        for name, x in samples.items():
+            np.testing.assert_equal(diagnostics.rhat(x), r[name])
+        self.assertEqual((), r['y'].shape)
+
+    def test_too_few_iterations(self):
+        for iterations in range(4):
+            x = self.random.normal(size=(2, iterations, 4))
+            d = diagnostics.diagnose(x)
+            for name in diagnostics.DIAGNOSTICS:
+                self.assertTrue(np.all(np.isnan(d[name])))
+
+    def test_masked_elements(self):
+        x = np.ma.masked_array(self.random.normal(size=(2, 100, 2)))
+        x[1] = np.ma.masked
+        r = diagnostics.rhat(x)
+        self.assertFalse(np.isnan(r[0]))
+        self.assertTrue(np.isnan(r[1]))
+
+    def test_average_rank_of_ties(self):
+        np.testing.assert_equal([[4, 1, 4, 2, 4]],
+                                diagnostics.rank(np.array([[3, 1, 3, 2, 3]])))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -10,7 +10,12 @@
 # GNU General Public License for more details.
 
 import os.path
+import pickle
+import shutil
 import sys
+import tempfile
+import threading
+import time
 import unittest
 
 import numpy as np
@@ -36,6 +41,10 @@ class TestModel(unittest.TestCase):
         self.model(code='model { y ~ dbern(1) }')
         self.model(code=b'model { y ~ dbern(1) }')
 
+    def test_syntax_error_in_model_string(self):
+        with self.assertRaises(pyjags.console.JagsError):
+            self.model(code='model { y ~ }')
+
     def test_creating_model_from_file(self):
         path = os.path.dirname(__file__)
         path = os.path.join(path, 'model.jags')
@@ -81,6 +90,35 @@ class TestModel(unittest.TestCase):
                         if k == '.RNG.name']
         self.assertEqual(expected_names, actual_names)
 
+    def test_data_block(self):
+        code = '''
+        data {
+            for (i in 1:N) {
+                y[i] ~ dnorm(0, 1)
+            }
+        }
+        model {
+            for (i in 1:N) {
+                y[i] ~ dnorm(mu, 1)
+            }
+            mu ~ dnorm(0, 1)
+        }'''
+        m = self.model(code, data={'N': 5}, chains=4)
+        self.assertEqual((5,), m.data['y'].shape)
+        self.assertEqual((1, 10, 4), m.sample(10, vars=['mu'])['mu'].shape)
+
+    def test_update_thread_is_reused(self):
+        m = self.model('model { x ~ dnorm(0, 1) }', chains=2)
+        if m.use_threads:
+            self.skipTest('Consoles are updated in threads of MultiConsole.')
+        m.update(10)
+        executor = m._executor
+        for _ in range(10):
+            m.sample(10)
+        self.assertIs(executor, m._executor)
+        m.close()
+        self.assertIsNone(m._executor)
+
     def test_empty_array(self):
         # This used to throw an exception.
         code = 'model { x ~ dbern(1) }'
@@ -176,6 +214,379 @@ class TestModel(unittest.TestCase):
         self.assertEqual(s['x'].shape, (3, 5, iterations, chains))
         self.assertEqual(s['mu'].shape, (3, iterations, chains))
 
+    def test_sample_iter_matches_sample(self):
+        code = 'model { x ~ dnorm(0, 1) }'
+        init = {'.RNG.name': 'base::Wichmann-Hill', '.RNG.seed': 1}
+        chains = 2
+        expected = self.model(code, init=init, chains=chains).sample(50, thin=3)
+
+        m = self.model(code, init=init, chains=chains)
+        chunks = list(m.sample_iter(50, thin=3, chunk=10))
+        self.assertEqual([(1, 3, chains)] * 5 + [(1, 2, chains)],
+                         [c['x'].shape for c in chunks])
+        actual = np.concatenate([c['x'] for c in chunks], axis=-2)
+        np.testing.assert_equal(expected['x'], actual)
+
+    def test_sample_into_preallocated_arrays(self):
+        code = 'model { for (i in 1:3) { x[i] ~ dnorm(0, 1) } }'
+        chains = 2
+        out = {'x': np.zeros((3, 25, chains + 1))}
+
+        m = self.model(code, chains=chains)
+        s1 = m.sample(10, out=out, chain_offset=1)
+        s2 = m.sample(15, out=out, iteration_offset=10, chain_offset=1)
+
+        self.assertEqual((3, 10, chains), s1['x'].shape)
+        self.assertEqual((3, 15, chains), s2['x'].shape)
+        np.testing.assert_equal(0, out['x'][..., 0])
+        self.assertTrue(np.all(out['x'][..., 1:] != 0))
+
+    def test_sample_into_too_small_arrays(self):
+        code = 'model { for (i in 1:3) { x[i] ~ dnorm(0, 1) } }'
+        m = self.model(code, chains=2)
+        iteration = m.iteration
+        for out, kwargs in [
+                ({'x': np.zeros((3, 9, 2))}, {}),
+                ({'x': np.zeros((3, 10, 2))}, {'iteration_offset': 1}),
+                ({'x': np.zeros((3, 10, 2))}, {'chain_offset': 1}),
+                ({'x': np.zeros((4, 10, 2))}, {}),
+                ({'x': np.zeros(10)}, {})]:
+            with self.assertRaises(ValueError):
+                m.sample(10, out=out, **kwargs)
+        self.assertEqual(iteration, m.iteration)
+        m.sample(20, thin=2, out={'x': np.zeros((3, 10, 2))})
+
+    def test_sample_into_store(self):
+        code = 'model { for (i in 1:3) { x[i] ~ dnorm(0, 1) } }'
+        chains = 2
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+
+        m = self.model(code, chains=chains)
+        s = m.sample(20, thin=2, store=directory)
+
+        self.assertIsInstance(s['x'], np.memmap)
+        self.assertEqual((3, 10, chains), s['x'].shape)
+        stored = np.load(os.path.join(directory, 'x.npy'))
+        np.testing.assert_equal(s['x'], stored)
+        self.assertTrue(np.all(stored != 0))
+
+    def test_sample_with_time_budget(self):
+        code = 'model { x ~ dnorm(0, 1) }'
+        m = self.model(code, chains=3)
+        start = time.time()
+        s = m.sample(seconds=0.5, thin=2)
+        self.assertLess(time.time() - start, 1.5)
+        self.assertEqual(1, s['x'].shape[0])
+        self.assertGreater(s['x'].shape[1], 0)
+        self.assertEqual(3, s['x'].shape[2])
+
+        s = m.sample(seconds=10, max_iterations=20)
+        self.assertEqual((1, 20, 3), s['x'].shape)
+
+        with self.assertRaises(ValueError):
+            m.sample(10, seconds=1)
+        with self.assertRaises(ValueError):
+            m.sample()
+
+    def test_summarize(self):
+        code = '''
+        model {
+            for (i in 1:3) {
+                x[i] ~ dnorm(i, 100)
+            }
+            c <- 2
+        }'''
+        m = self.model(code, chains=3)
+        s = m.summarize(300, quantiles=[0.1, 0.5], chunk=40)
+
+        self.assertEqual((3,), s['x']['mean'].shape)
+        self.assertEqual((3, 2), s['x']['quantiles'].shape)
+        np.testing.assert_allclose([1, 2, 3], s['x']['mean'], atol=0.1)
+        np.testing.assert_allclose([0.1] * 3, s['x']['sd'], atol=0.02)
+        np.testing.assert_equal(2, s['c']['mean'])
+        np.testing.assert_equal(0, s['c']['sd'])
+        np.testing.assert_equal(2, s['c']['quantiles'])
+
+    def test_sample_until(self):
+        code = '''
+        model {
+            x ~ dnorm(0, 1)
+            c <- 2
+        }'''
+        m = self.model(code, chains=4)
+        samples, history = m.sample_until(100000, min_ess=400, chunk=200)
+
+        self.assertTrue(history[-1]['converged'])
+        self.assertLess(history[-1]['iterations'], 100000)
+        iterations = history[-1]['iterations']
+        self.assertEqual((1, iterations, 4), samples['x'].shape)
+        self.assertEqual((1, iterations, 4), samples['c'].shape)
+        self.assertEqual(200, history[0]['iterations'])
+        self.assertGreaterEqual(history[-1]['ess_bulk'], 400)
+        self.assertLessEqual(history[-1]['rhat'], 1.01)
+
+    def test_sample_until_max_iterations(self):
+        code = '''
+        model {
+            x ~ dnorm(0, 1)
+        }'''
+        m = self.model(code, chains=2)
+        samples, history = m.sample_until(50, min_ess=10000, chunk=20)
+
+        self.assertEqual([20, 40, 50], [h['iterations'] for h in history])
+        self.assertFalse(history[-1]['converged'])
+        self.assertEqual((1, 50, 2), samples['x'].shape)
+
+    def test_sample_until_with_single_draw_chunks(self):
+        code = 'model { x ~ dnorm(0, 1) }'
+        m = self.model(code, chains=2)
+        samples, history = m.sample_until(60, thin=10, chunk=10)
+
+        self.assertEqual((1, 6, 2), samples['x'].shape)
+        self.assertEqual(6, len(history))
+        for entry in history[:3]:
+            self.assertTrue(np.isnan(entry['rhat']))
+            self.assertEqual({}, entry['diagnostics'])
+            self.assertFalse(entry['converged'])
+        self.assertIn('x', history[3]['diagnostics'])
+
+    def test_estimate(self):
+        code = 'model { for (i in 1:3) { x[i] ~ dnorm(0, 1) } y ~ dnorm(0, 1) }'
+        m = self.model(code, chains=2)
+        iteration = m.iteration
+        estimate = m.estimate(1000, vars=['x'], thin=2, seconds=0.2)
+        self.assertGreater(estimate.seconds, 0)
+        self.assertEqual({'x': 3 * 500 * 2 * 8}, estimate.variables)
+        self.assertEqual(3 * 500 * 2 * 8, estimate.bytes)
+        self.assertGreater(m.iteration, iteration)
+
+    def test_checkpoint_and_restore(self):
+        code = '''
+        model {
+            mu ~ dnorm(0, 1)
+            for (i in 1:3) {
+                x[i] ~ dnorm(mu, 1)
+            }
+        }'''
+        data = {'x': [1, 2, 3]}
+        m = self.model(code, data=data, chains=3, adapt=100)
+        iteration = m.iteration
+        m.update(50)
+        self.assertEqual(iteration + 50, m.iteration)
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'checkpoint.npz')
+        m.checkpoint(path)
+        r = pyjags.Model.restore(code, data, path)
+
+        self.assertEqual(3, r.chains)
+        self.assertEqual(iteration + 50, r.iteration)
+        for a, b in zip(m.parameters, r.parameters):
+            np.testing.assert_equal(a, b)
+        np.testing.assert_equal(m.sample(20, vars=['mu']),
+                                r.sample(20, vars=['mu']))
+        self.assertEqual(iteration + 70, r.iteration)
+
+    def test_pickle(self):
+        code = '''
+        model {
+            mu ~ dnorm(0, 1)
+            for (i in 1:3) {
+                x[i] ~ dnorm(mu, 1)
+            }
+        }'''
+        m = self.model(code, data={'x': [1, 2, 3]}, chains=2)
+        m.update(10)
+        u = pickle.loads(pickle.dumps(m))
+
+        self.assertEqual(2, u.chains)
+        self.assertEqual(m.iteration, u.iteration)
+        np.testing.assert_equal(m.data, u.data)
+        np.testing.assert_equal(m.sample(10, vars=['mu']),
+                                u.sample(10, vars=['mu']))
+
+    def test_pickle_model_from_file(self):
+        path = os.path.join(os.path.dirname(__file__), 'model.jags')
+        m = self.model(file=path)
+        u = pickle.loads(pickle.dumps(m))
+        self.assertEqual(set(m.variables), set(u.variables))
+
+    def test_with_data(self):
+        code = '''
+        model {
+            mu ~ dnorm(0, 0.0001)
+            for (i in 1:length(x)) {
+                x[i] ~ dnorm(mu, 100)
+            }
+        }'''
+        m = self.model(code, data={'x': [1, 1, 1]}, chains=2)
+        np.testing.assert_allclose(1, m.sample(100)['mu'], atol=0.5)
+
+        self.assertIs(m, m.with_data({'x': [5, 5, 5, 5]}, adapt=100))
+        np.testing.assert_equal([5, 5, 5, 5], m.data['x'])
+        np.testing.assert_allclose(5, m.sample(100)['mu'], atol=0.5)
+
+        with self.assertRaises(ValueError):
+            m.with_data({'y': 1})
+        np.testing.assert_equal([5, 5, 5, 5], m.data['x'])
+
+    def test_restore_model_with_deterministic_nodes(self):
+        code = '''
+        model {
+            mu ~ dnorm(0, 1)
+            m <- 2 * mu
+            tau ~ dgamma(1, 1)
+            for (i in 1:3) {
+                x[i] ~ dnorm(m, tau)
+            }
+        }'''
+        data = {'x': [1, 2, 3]}
+        m = self.model(code, data=data, chains=2)
+        m.update(50)
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'checkpoint.npz')
+        m.checkpoint(path)
+        expected = m.sample(20, vars=['m', 'mu', 'tau'])
+        np.testing.assert_equal(2 * expected['mu'], expected['m'])
+
+        # Restored in place, as when resuming, and in a new model.
+        m._restore_state(pyjags.checkpoint.load_checkpoint(path))
+        np.testing.assert_equal(expected, m.sample(20, vars=['m', 'mu', 'tau']))
+        r = pyjags.Model.restore(code, data, path)
+        np.testing.assert_equal(expected, r.sample(20, vars=['m', 'mu', 'tau']))
+
+    def test_resume_interrupted_sampling(self):
+        code = '''
+        model {
+            mu ~ dnorm(0, 1)
+            for (i in 1:3) {
+                x[i] ~ dnorm(mu, 1)
+            }
+        }'''
+        data = {'x': [1, 2, 3]}
+        init = [{'.RNG.name': 'base::Mersenne-Twister', '.RNG.seed': seed}
+                for seed in (1, 2)]
+
+        def model():
+            return self.model(code, data=data, init=init, chains=2)
+
+        reference = model()
+        expected = reference.sample(60, vars=['mu'], thin=2)
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        m = model()
+        update = m._update_progress
+        done = []
+
+        def interrupted_update(progress, iterations):
+            if len(done) == 2:
+                raise RuntimeError('Interrupted.')
+            update(progress, iterations)
+            done.append(iterations)
+
+        m._update_progress = interrupted_update
+        with self.assertRaises(RuntimeError):
+            m.sample(60, vars=['mu'], thin=2, checkpoint_every=20,
+                     checkpoint_dir=directory)
+
+        m = model()
+        samples = m.sample(60, vars=['mu'], thin=2, checkpoint_every=20,
+                           checkpoint_dir=directory, resume=True)
+        self.assertEqual(reference.iteration, m.iteration)
+        np.testing.assert_equal(expected['mu'], samples['mu'])
+
+        with self.assertRaises(ValueError):
+            model().sample(60, vars=['mu'], thin=3, checkpoint_every=20,
+                           checkpoint_dir=directory, resume=True)
+
+    def test_resume_update(self):
+        code = 'model { x ~ dnorm(0, 1) }'
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        m = self.model(code, chains=2)
+        iteration = m.iteration
+        m.update(50, checkpoint_every=20, checkpoint_dir=directory)
+        self.assertEqual(iteration + 50, m.iteration)
+
+        m = self.model(code, chains=2)
+        m.update(50, checkpoint_every=20, checkpoint_dir=directory,
+                 resume=True)
+        self.assertEqual(iteration + 50, m.iteration)
+
+    def test_invalid_checkpoint_every(self):
+        m = self.model('model { x ~ dnorm(0, 1) }', chains=2)
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        for checkpoint_every in (0, -10):
+            with self.assertRaises(ValueError):
+                m.update(100, checkpoint_every=checkpoint_every,
+                         checkpoint_dir=directory)
+            with self.assertRaises(ValueError):
+                m.sample(100, checkpoint_every=checkpoint_every,
+                         checkpoint_dir=directory)
+
+    def test_moments_monitor(self):
+        code = '''
+        model {
+            c <- 2
+            x ~ dnorm(0, 1)
+        }'''
+        chains = 2
+        m = self.model(code, chains=chains)
+        s = m.sample(100, monitor_type='moments')
+
+        self.assertEqual((1, 2, chains), s['c'].shape)
+        self.assertEqual((1, 2, chains), s['x'].shape)
+        np.testing.assert_equal(2, s['c'][0, 0])
+        np.testing.assert_equal(0, s['c'][0, 1])
+        self.assertTrue(np.all(s['x'][0, 1] > 0))
+
+    def test_statistics_monitors_require_samples_in_memory(self):
+        m = self.model('model { x ~ dnorm(0, 1) }', chains=2)
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        out = {'x': np.zeros((1, 10, 2))}
+        for monitor_type in ('moments', 'histogram'):
+            with self.assertRaises(ValueError):
+                m.sample(10, monitor_type=monitor_type, out=out)
+            with self.assertRaises(ValueError):
+                m.sample(10, monitor_type=monitor_type, store=directory)
+            with self.assertRaises(ValueError):
+                m.sample(10, monitor_type=monitor_type, checkpoint_every=5,
+                         checkpoint_dir=directory)
+
+    def test_histogram_monitor(self):
+        code = 'model { x ~ dnorm(0, 1) }'
+        chains = 2
+        iterations = 500
+        m = self.model(code, chains=chains)
+        s = m.sample(iterations, monitor_type='histogram')
+
+        self.assertEqual((1, 102, chains), s['x'].shape)
+        np.testing.assert_equal(iterations, s['x'][0, 2:].sum(axis=0))
+        self.assertTrue(np.all(s['x'][0, 1] > 0))
+
+    def test_histogram_monitor_in_chunks(self):
+        code = 'model { x ~ dnorm(0, 1) }'
+        m = self.model(code, chains=2)
+        chunks = list(m.sample_iter(500, chunk=200,
+                                    monitor_type='histogram'))
+        self.assertEqual(3, len(chunks))
+        counts = [c['x'][0, 2:].sum(axis=0) for c in chunks]
+        np.testing.assert_equal([[200, 200], [200, 200], [100, 100]], counts)
+
+    def test_samples_are_writeable(self):
+        code = 'model { x ~ dnorm(0, 1) }'
+        m = self.model(code, chains=2)
+        s = m.sample(10)['x']
+        s[0, 0, 0] = 42
+        self.assertEqual(42, s[0, 0, 0])
+
     def test_missing_input_data(self):
         code = '''
         model {
@@ -201,6 +612,24 @@ class TestModel(unittest.TestCase):
         self.assertIn(0, x3)
         self.assertIn(1, x3)
 
+    def test_nan_input_data_is_missing(self):
+        code = '''
+        model {
+            for (i in 1:length(x)) {
+                x[i] ~ dbern(0.5)
+            }
+        }'''
+
+        data = {'x': np.array([0, np.nan, 1])}
+        m = self.model(code, data=data, chains=2)
+        s = m.sample(100, vars=['x'])
+
+        np.testing.assert_equal(0, s['x'][0])
+        np.testing.assert_equal(1, s['x'][2])
+        self.assertIn(0, s['x'][1])
+        self.assertIn(1, s['x'][1])
+        self.assertTrue(m.data['x'].mask[1])
+
     @unittest.skipIf(pyjags.version() < (4,0,0), "Not supported before JAGS 4.0.0")
     def test_missing_sample_data(self):
         code = '''
@@ -245,11 +674,80 @@ if sys.version_info[0] > 2:
         def model(self, *args, **kwargs):
             return pyjags.Model(*args, threads=3, **kwargs)
 
+        def test_threads_are_reused_and_stopped_on_close(self):
+            m = self.model('model { x ~ dnorm(0, 1) }', chains=4)
+
+            def console_threads():
+                futures = [m.console.submit(i, threading.current_thread)
+                           for i in range(len(m.console.consoles))]
+                return [f.result() for f in futures]
+
+            threads = console_threads()
+            self.assertEqual(4, len(set(threads)))
+            for _ in range(10):
+                m.sample(10)
+                self.assertEqual(threads, console_threads())
+            m.close()
+            self.assertFalse(any(t.is_alive() for t in threads))
+
 
     class TestModelWithChainsPerThread(TestModel):
 
         def model(self, *args, **kwargs):
             return pyjags.Model(*args, threads=3, chains_per_thread=2, **kwargs)
 
+
+    class TestModelWithDynamicScheduler(TestModel):
+
+        def model(self, *args, **kwargs):
+            return pyjags.Model(*args, threads=3, scheduler='dynamic', **kwargs)
+
+        def test_threads_are_shared_by_chains(self):
+            m = self.model('model { x ~ dnorm(0, 1) }', chains=4)
+            self.assertEqual(100, m.sample(100)['x'].shape[1])
+            futures = [m.console.submit(i % 4, threading.current_thread)
+                       for i in range(20)]
+            threads = set(f.result() for f in futures)
+            self.assertLessEqual(len(threads), 3)
+            m.close()
+            self.assertFalse(any(t.is_alive() for t in threads))
+
+        def test_zero_iterations(self):
+            m = self.model('model { x ~ dnorm(0, 1) }', chains=3)
+            iteration = m.iteration
+            m.update(0)
+            self.assertEqual(iteration, m.iteration)
+
+        def test_invalid_scheduler_throws_exception(self):
+            with self.assertRaises(ValueError):
+                pyjags.Model('model { x ~ dbern(1) }', scheduler='random')
+
+
+    class TestModelWithAutoThreads(unittest.TestCase):
+
+        def test_auto_threads(self):
+            m = pyjags.Model('model { x ~ dnorm(0, 1) }', chains=4,
+                             threads='auto', progress_bar=False)
+            self.addCleanup(m.close)
+            self.assertIn((m.threads, m._options['chains_per_thread']),
+                          [layout[:2] for layout in m.layouts])
+            self.assertEqual((1, 4, 4), m.sample(4)['x'].shape)
+
+        def test_auto_threads_with_single_chain(self):
+            m = pyjags.Model('model { x ~ dnorm(0, 1) }', chains=1,
+                             threads='auto', progress_bar=False)
+            self.assertEqual(1, m.threads)
+            self.assertEqual(1, len(m.layouts))
+
+
+    class TestModelWithProcesses(TestModel):
+
+        def model(self, *args, **kwargs):
+            return pyjags.Model(*args, threads=3, backend='process', **kwargs)
+
+        def test_invalid_backend_throws_exception(self):
+            with self.assertRaises(ValueError):
+                pyjags.Model('model { x ~ dbern(1) }', backend='fiber')
+
 if __name__ == '__main__':
     unittest.main()
@@ -23,9 +23,10 @@ class TestModules(unittest.TestCase):
         pyjags.load_module('basemod')
         pyjags.load_module('bugs')
         pyjags.load_module('lecuyer')
+        pyjags.load_module('pyjags')
 
         self.assertEqual(
-            ['basemod', 'bugs', 'lecuyer'],
+            ['basemod', 'bugs', 'lecuyer', 'pyjags'],
             pyjags.list_modules())
 
 if __name__ == '__main__':
@@ -0,0 +1,76 @@
+# Copyright (C) 2016 Tomasz Miasko
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+import unittest
+
+from pyjags.progressbar import deadline_partition
+
+
+class FakeTimer:
+    """Timer where each iteration takes given number of seconds."""
+
+    def __init__(self, seconds_per_iteration):
+        self.seconds_per_iteration = seconds_per_iteration
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def run(self, partition):
+        result = []
+        for steps in partition:
+            result.append(steps)
+            self.now += steps * self.seconds_per_iteration
+        return result
+
+
+class TestDeadlinePartition(unittest.TestCase):
+
+    def test_stops_at_deadline(self):
+        timer = FakeTimer(0.01)
+        steps = timer.run(deadline_partition(10 ** 6, 2.0, 0.5, timer))
+        # Budget without the default margin of 5% allows 190 iterations.
+        self.assertGreaterEqual(sum(steps), 185)
+        self.assertLessEqual(timer.now, 1.9 + 1e-9)
+        self.assertTrue(all(s <= 50 for s in steps))
+
+    def test_stops_at_maximum_iterations(self):
+        timer = FakeTimer(0.01)
+        steps = timer.run(deadline_partition(30, 2.0, 0.5, timer))
+        self.assertEqual(30, sum(steps))
+
+    def test_runs_at_least_one_iteration(self):
+        timer = FakeTimer(10.0)
+        steps = timer.run(deadline_partition(100, 2.0, 0.5, timer))
+        self.assertEqual([1], steps)
+
+    def test_iterations_becoming_slower(self):
+        # The first iteration is three times faster than the rest.
+        timer = FakeTimer(0.001)
+        partition = deadline_partition(10 ** 6, 2.0, 5.0, timer)
+        steps = [next(partition)]
+        timer.now += steps[0] * timer.seconds_per_iteration / 3
+        for n in partition:
+            steps.append(n)
+            timer.now += n * timer.seconds_per_iteration
+        self.assertLessEqual(timer.now, 2.0)
+        self.assertGreater(timer.now, 1.5)
+        self.assertTrue(all(n <= sum(steps[:i]) or i == 0
+                            for i, n in enumerate(steps)))
+
+    def test_keeps_margin(self):
+        timer = FakeTimer(0.01)
+        timer.run(deadline_partition(10 ** 6, 2.0, 5.0, timer, margin=0.25))
+        self.assertLessEqual(timer.now, 1.5 + 1e-9)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+# Copyright (C) 2016 Tomasz Miasko
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+import unittest
+
+import numpy as np
+
+from pyjags.summary import Moments, QuantileSketch, Summary
+
+
+class TestMoments(unittest.TestCase):
+
+    def test_merged_batches(self):
+        x = np.random.normal(size=(5, 1000))
+        a = Moments(5)
+        b = Moments(5)
+        for i in range(0, 600, 100):
+            a.update(x[:, i:i + 100])
+        b.update(x[:, 600:])
+        a.merge(b)
+
+        self.assertEqual(1000, a.count)
+        np.testing.assert_allclose(x.mean(axis=1), a.mean)
+        np.testing.assert_allclose(x.std(axis=1, ddof=1), a.sd)
+
+
+class TestQuantileSketch(unittest.TestCase):
+
+    def test_quantiles(self):
+        x = np.random.uniform(size=(4, 20000))
+        a = QuantileSketch(4, seed=1)
+        b = QuantileSketch(4, seed=2)
+        for i in range(0, 10000, 1000):
+            a.update(x[:, i:i + 1000])
+        b.update(x[:, 10000:])
+        a.merge(b)
+
+        self.assertEqual(20000, a.count)
+        q = [0.05, 0.5, 0.95]
+        expected = np.percentile(x, [100 * p for p in q], axis=1).T
+        np.testing.assert_allclose(expected, a.quantile(q), atol=0.02)
+
+    def test_exact_for_few_values(self):
+        x = np.arange(10.0).reshape(1, 10)
+        sketch = QuantileSketch(1)
+        sketch.update(x)
+        np.testing.assert_equal([[0, 4, 9]], sketch.quantile([0, 0.5, 1]))
+
+
+class TestSummary(unittest.TestCase):
+
+    def test_missing_elements_are_masked(self):
+        samples = np.ma.masked_array(np.zeros((2, 10, 3)))
+        samples[1, 4, 2] = np.ma.masked
+        summary = Summary((2,))
+        summary.update(samples)
+        result = summary.result([0.5])
+        np.testing.assert_equal([False, True], result['mean'].mask)
+        np.testing.assert_equal([[False], [True]], result['quantiles'].mask)
+
+
+if __name__ == '__main__':
+    unittest.main()